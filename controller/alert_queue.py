@@ -0,0 +1,82 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger("NIDS_Controller.AlertQueue")
+
+class AlertQueue:
+    """
+    Fixed pool of worker threads fed by a bounded queue.
+
+    submit() never blocks: when `capacity` alerts are already waiting it
+    returns False and the HTTP handler tells the sensor to retry later,
+    instead of starting one thread (and one SQLite session) per alert.
+    """
+    def __init__(self, handler, workers=4, capacity=1000, max_samples=10000):
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=capacity)
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.latency = deque(maxlen=max_samples)  # seconds from submit to done
+        self.threads = [threading.Thread(target=self._run, daemon=True, name=f"alert-worker-{i}")
+                        for i in range(workers)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, *args):
+        """Queues handler(*args). Returns False if the queue is full."""
+        try:
+            self.queue.put_nowait((time.perf_counter(), args))
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            return False
+        with self.lock:
+            self.accepted += 1
+        return True
+
+    def _run(self):
+        while True:
+            queued_at, args = self.queue.get()
+            try:
+                self.handler(*args)
+                failed = 0
+            except Exception:
+                logger.exception(f"Alert processing failed for {args}")
+                failed = 1
+            finally:
+                self.queue.task_done()
+            with self.lock:
+                self.processed += 1
+                self.failed += failed
+                self.latency.append(time.perf_counter() - queued_at)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def metrics(self):
+        with self.lock:
+            ordered = sorted(self.latency)
+            counts = {
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "processed": self.processed,
+                "failed": self.failed
+            }
+
+        def pct(p):
+            return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] * 1000 if ordered else 0.0
+
+        return {
+            "depth": self.depth(),
+            "capacity": self.capacity,
+            "workers": len(self.threads),
+            **counts,
+            "latency_ms": {"p50": pct(50), "p99": pct(99), "max": ordered[-1] * 1000 if ordered else 0.0}
+        }
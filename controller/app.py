@@ -1,15 +1,23 @@
+import atexit
 import logging
-import threading
 import json
 import os
-from models import db, SensorNode, Alert, BlockEvent
-from datetime import datetime 
+from models import db, SensorNode, Alert, BlockEvent, configure_sqlite, get_or_create_sensor
+from datetime import datetime, timezone
+import base64
 import secrets
 import ipaddress
+import zlib
 
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, render_template, url_for
 from verification import VerificationEngine
+from alert_queue import AlertQueue
+from retention import RetentionJob
+from db_writer import DbWriter
+from enforcement import Enforcer
+from event_bus import EventBus
+from row_counters import RowCounters
 load_dotenv()
 # --- CONFIGURATION ---
 with open('config.json') as f:
@@ -26,6 +34,8 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'nids.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
+with app.app_context():
+    configure_sqlite(db.engine) # WAL + tuned pragmas on every connection
 
 # NOTE: Tables created manually via create_db_manual.py
 # Do NOT use db.create_all() - it wipes existing data!
@@ -50,7 +60,34 @@ console_handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
 logger.addHandler(console_handler)
 
 # --- CORE ENGINE ---
-engine = VerificationEngine(CONFIG,app)
+# Row counts for /api/status, counted once here and then kept by the write path
+counters = RowCounters(app, ['sensor_node', 'alert', 'block_event'])
+# One writer thread group-commits alerts, blocks and heartbeats
+db_writer = DbWriter(app, CONFIG.get('DB_WRITE_BATCH', 500), CONFIG.get('DB_WRITE_DELAY_MS', 5) / 1000.0,
+                     counters=counters)
+atexit.register(db_writer.flush)
+# Blocks are batched into one `ipset restore` per flush ("dry-run" only logs them)
+enforcer = Enforcer(app, CONFIG.get('ENFORCEMENT_BACKEND', 'ipset'), CONFIG.get('ENFORCEMENT_FLUSH_MS', 200) / 1000.0)
+# Live dashboard feed: alerts, blocks, unbans and heartbeats pushed over /api/stream
+events = EventBus(client_capacity=CONFIG.get('STREAM_CLIENT_BUFFER', 1000),
+                  max_clients=CONFIG.get('STREAM_MAX_CLIENTS', 50))
+engine = VerificationEngine(CONFIG,app,db_writer,enforcer,events)
+# Alerts are verified by a fixed pool of workers; a full queue pushes back on the sensors
+alert_queue = AlertQueue(engine.process_threat,
+                         workers=CONFIG.get('ALERT_WORKERS', 4),
+                         capacity=CONFIG.get('ALERT_QUEUE_SIZE', 1000))
+RETRY_AFTER_SECONDS = CONFIG.get('RETRY_AFTER_SECONDS', 2)
+MAX_BATCH_ALERTS = CONFIG.get('MAX_BATCH_ALERTS', 1000) # Per POST /alerts/batch
+MAX_BATCH_BYTES = 16 * 1024 * 1024 # Decompressed body limit (gzip bombs)
+# Old alerts are rolled into per-IP hourly totals (alert_hourly) and deleted
+retention = None
+if CONFIG.get('ALERT_RETENTION_DAYS', 30):
+    retention = RetentionJob(app, CONFIG.get('ALERT_RETENTION_DAYS', 30),
+                             CONFIG.get('RETENTION_INTERVAL_SECONDS', 3600),
+                             min_age_seconds=CONFIG.get('HISTORY_TTL_SECONDS', 3600),
+                             counters=counters).start()
+MAX_PAGE_SIZE = CONFIG.get('MAX_PAGE_SIZE', 1000) # Alerts per /api/alerts page
+STARTED = str(int(datetime.utcnow().timestamp())) # Counter versions restart with the controller
 # --- SECURITY HELPERS ---
 def check_auth():
     """
@@ -80,13 +117,19 @@ def validate_alert_data(data):
         ipaddress.ip_address(data['ip'])
     except ValueError:
         return False, f"Invalid IP format: {data['ip']}"
+    if not isinstance(data['score'], (int, float)) or isinstance(data['score'], bool):
+        return False, f"Invalid score: {data['score']}"
+    # 3. Optional suppressed-hit count from the sensor's rate limit
+    suppressed = data.get('suppressed', 0)
+    if not isinstance(suppressed, int) or isinstance(suppressed, bool) or suppressed < 0:
+        return False, f"Invalid suppressed count: {suppressed}"
     return True, None
     
 # --- API ENDPOINTS ---
 @app.route('/alert', methods=['POST'])
 def receive_alert():
     """
-    Sensor sends: { "sensor_id": "node1", "ip": "1.2.3.4", "score": 85 }
+    Sensor sends: { "sensor_id": "node1", "ip": "1.2.3.4", "score": 85, "suppressed": 12 }
     """
     # 1. Security Check (Hardened)
     if not check_auth():
@@ -98,16 +141,96 @@ def receive_alert():
     if not is_valid:
         logger.warning(f"⚠️ Invalid Payload from {request.remote_addr}: {error}")
         return jsonify({"error": error}), 400
-    # 3. Async Processing (Fire and Forget)
-    # The logic happens in the background.
-    t = threading.Thread(target=engine.process_threat, args=(
+    # 3. Async Processing (bounded queue, fixed worker pool)
+    # The logic happens in the background; when the queue is full the sensor
+    # keeps the alert in its spool and retries after Retry-After seconds.
+    queued = alert_queue.submit(
         data.get('sensor_id'),
         data.get('ip'),
-        float(data.get('score'))
-    ))
-    t.start()
+        float(data.get('score')),
+        data.get('suppressed', 0)
+    )
+    if not queued:
+        if alert_queue.rejected % 100 == 1: # Don't write a log line per rejected alert during a flood
+            logger.warning(f"⏳ Alert queue full ({alert_queue.capacity}), asking sensors to retry ({alert_queue.rejected} rejected so far)")
+        response = jsonify({"error": "Alert queue full, retry later"})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 503
     return jsonify({"status": "processing", "message": "Alert received"}), 200
 
+def read_alert_batch():
+    """
+    Parses a bulk alert body: a JSON array (or {"alerts": [...]}), or one
+    alert per line with Content-Type application/x-ndjson; optionally gzip'd.
+    Returns: (alerts: list or None, error_msg: str)
+    """
+    body = request.get_data()
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        try:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, MAX_BATCH_BYTES)
+            if decompressor.unconsumed_tail:
+                return None, "Batch too large"
+        except zlib.error:
+            return None, "Invalid gzip body"
+    try:
+        if request.mimetype == 'application/x-ndjson':
+            alerts = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            alerts = json.loads(body)
+            if isinstance(alerts, dict):
+                alerts = alerts.get('alerts')
+    except ValueError:
+        return None, "Invalid JSON"
+    if not isinstance(alerts, list):
+        return None, "Expected a list of alerts"
+    return alerts, None
+
+@app.route('/alerts/batch', methods=['POST'])
+def receive_alert_batch():
+    """
+    Bulk version of /alert for sensors with several alerts pending.
+    Sensor sends: [{ "sensor_id": "node1", "ip": "1.2.3.4", "score": 85, "suppressed": 12 }, ...]
+    Returns one {"status": ...} per alert, in order: 200 queued, 400 invalid,
+    503 queue full (retry that alert after Retry-After seconds).
+    """
+    if not check_auth():
+        logger.warning(f"⛔ Unauthorized Alert attempt from {request.remote_addr}")
+        return jsonify({"error": "Unauthorized"}), 401
+    alerts, error = read_alert_batch()
+    if error:
+        logger.warning(f"⚠️ Invalid Batch from {request.remote_addr}: {error}")
+        return jsonify({"error": error}), 400
+    if len(alerts) > MAX_BATCH_ALERTS:
+        return jsonify({"error": f"Too many alerts, max {MAX_BATCH_ALERTS} per batch"}), 413
+
+    results = []
+    accepted = invalid = full = 0
+    for data in alerts:
+        is_valid, error = validate_alert_data(data) if isinstance(data, dict) else (False, "Alert must be an object")
+        if not is_valid:
+            invalid += 1
+            results.append({"status": 400, "error": error})
+        elif alert_queue.submit(data['sensor_id'], data['ip'], float(data['score']), data.get('suppressed', 0)):
+            accepted += 1
+            results.append({"status": 200})
+        else:
+            full += 1
+            results.append({"status": 503, "error": "Alert queue full, retry later"})
+
+    if invalid:
+        logger.warning(f"⚠️ {invalid} invalid alerts in batch from {request.remote_addr}")
+    response = jsonify({"accepted": accepted, "invalid": invalid, "retry": full, "results": results})
+    if full:
+        logger.warning(f"⏳ Alert queue full ({alert_queue.capacity}), {full} of {len(alerts)} batched alerts to retry")
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response, 200
+
+# Dashboard
+@app.route('/', methods=['GET'])
+def dashboard():
+    return render_template('dashboard.html')
+
 # [NEW] Management API: List Nodes
 @app.route('/api/nodes', methods=['GET'])
 def list_nodes():
@@ -117,46 +240,132 @@ def list_nodes():
         "ip": n.ip, 
         "trust": n.trust_score, 
         "status": n.status,
-        "last_seen": n.last_seen.isoformat() if n.last_seen else None
+        "last_seen": n.last_seen.isoformat() if n.last_seen else None,
+        "metrics": json.loads(n.metrics) if n.metrics else None
     } for n in nodes])
 
+def parse_time(value):
+    """ISO 8601 query parameter -> naive UTC datetime (what the alert table stores)."""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def encode_cursor(alert):
+    return base64.urlsafe_b64encode(f"{alert.timestamp.isoformat()}|{alert.id}".encode()).decode()
+
+def decode_cursor(cursor):
+    timestamp, _, alert_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+    return datetime.fromisoformat(timestamp), int(alert_id)
+
 # [NEW] Management API: List Alerts
 @app.route('/api/alerts', methods=['GET'])
 def list_alerts():
-    limit = request.args.get('limit', 50, type=int)
-    alerts = Alert.query.order_by(Alert.timestamp.desc()).limit(limit).all()
-    return jsonify([{
+    """
+    Newest alerts first, optionally filtered by ?ip=, ?sensor=, ?since= and
+    ?until= (ISO 8601, UTC). Pages are keyset-paginated on (timestamp, id):
+    pass the X-Next-Cursor header of one page as ?cursor= to get the next,
+    which costs the same at any depth. Responses carry an ETag that only
+    changes when alerts are written, so If-None-Match polls cost no query.
+    """
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+    etag = f"{STARTED}-{counters.version('alert')}-{zlib.crc32(request.query_string):08x}"
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    query = Alert.query
+    try:
+        if request.args.get('ip'):
+            query = query.filter(Alert.source_ip == request.args['ip'])
+        if request.args.get('sensor'):
+            query = query.filter(Alert.sensor_id == request.args['sensor'])
+        if request.args.get('since'):
+            query = query.filter(Alert.timestamp >= parse_time(request.args['since']))
+        if request.args.get('until'):
+            query = query.filter(Alert.timestamp < parse_time(request.args['until']))
+        if request.args.get('cursor'):
+            query = query.filter(db.tuple_(Alert.timestamp, Alert.id) < decode_cursor(request.args['cursor']))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter or cursor: {e}"}), 400
+    alerts = query.order_by(Alert.timestamp.desc(), Alert.id.desc()).limit(limit).all()
+
+    response = jsonify([{
         "id": a.id,
         "sensor": a.sensor_id,
         "ip": a.source_ip,
         "score": a.score,
+        "suppressed": a.suppressed or 0,
         "time": a.timestamp.isoformat()
     } for a in alerts])
+    if len(alerts) == limit:
+        cursor = encode_cursor(alerts[-1])
+        response.headers['X-Next-Cursor'] = cursor
+        args = {**request.args.to_dict(), 'cursor': cursor}
+        response.headers['Link'] = f'<{url_for("list_alerts", **args)}>; rel="next"'
+    response.set_etag(etag, weak=True)
+    return response
 
 # [NEW] Management API: System Status
 @app.route('/api/status', methods=['GET'])
 def system_status():
-    node_count = SensorNode.query.count()
-    alert_count = Alert.query.count()
-    block_count = BlockEvent.query.count()
     return jsonify({
-        "active_sensors": node_count,
-        "total_alerts": alert_count,
-        "active_blocks": block_count
+        "active_sensors": counters.count('sensor_node'),
+        "total_alerts": counters.count('alert'),
+        "active_blocks": counters.count('block_event'),
+        "alert_queue": alert_queue.metrics(),
+        "threat_window": engine.window.metrics(),
+        "retention": retention.metrics() if retention else None,
+        "db_writer": db_writer.metrics(),
+        "enforcement": enforcer.metrics(),
+        "stream": events.metrics()
     })
 
+# Active bans from the enforcer's memory (the dashboard expires them locally)
+@app.route('/api/blocks', methods=['GET'])
+def list_blocks():
+    return jsonify([{
+        "ip": ip,
+        "expires_at": datetime.utcfromtimestamp(expiry).isoformat()
+    } for ip, expiry in sorted(enforcer.active_bans().items(), key=lambda item: item[1])])
+
+# Live feed: Server-Sent Events, so open dashboards don't poll the database
+@app.route('/api/stream', methods=['GET'])
+def stream_events():
+    """
+    Pushes "alert", "block", "unban" and "sensor" events as they happen.
+    Clients load /api/alerts, /api/blocks and /api/nodes once and apply the
+    events on top (bans also end when their expires_at passes); a "resync"
+    event means events were missed and the snapshot must be re-read.
+    """
+    sub = events.subscribe(request.headers.get('Last-Event-ID'))
+    if sub is None:
+        response = jsonify({"error": "Too many stream clients"})
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+        return response, 503
+    response = Response(events.stream(sub), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Don't let a reverse proxy hold events back
+    return response
+
 # [NEW] Management API: Unban
 @app.route('/api/action/unban', methods=['POST'])
 def unban_ip():
     data = request.json
     ip = data.get('ip')
+    try:
+        ipaddress.ip_address(ip)
+    except ValueError:
+        return jsonify({"error": f"Invalid IP format: {ip}"}), 400
     
-    # Logic to call unblock script would go here (Jisto's task)
     logger.info(f"[ADMIN] [UNBAN] Request to unban {ip}")
+    was_blocked = enforcer.unblock(ip)
     
     # Remove from BlockEvent DB
-    BlockEvent.query.filter_by(ip=ip).delete()
-    db.session.commit()
+    removed = db_writer.submit(lambda: BlockEvent.query.filter_by(ip=ip).delete(), wait=True).result()
+    counters.remove('block_event', removed)
+    events.publish("unban", {"ip": ip, "was_blocked": was_blocked, "time": datetime.utcnow().isoformat()})
     
     return jsonify({"status": "unbanned", "ip": ip})
 
@@ -171,15 +380,22 @@ def heartbeat():
     data = request.json
     sensor_id = data.get('sensor_id')
     
-    # [NEW] Update Sensor in DB
-    node = SensorNode.query.get(sensor_id)
-    if not node:
-        node = SensorNode(id=sensor_id, ip=request.remote_addr)
-        db.session.add(node)
-    
-    node.last_seen = datetime.utcnow()
-    node.status = "online"
-    db.session.commit()
+    # [NEW] Update Sensor in DB (group-committed with other writes)
+    remote_addr = request.remote_addr
+    seen_at = datetime.utcnow()
+    # Keep the latest capacity metrics (everything but the id) for the dashboard
+    metrics = json.dumps({k: v for k, v in data.items() if k != 'sensor_id'})
+    def update_node():
+        node = get_or_create_sensor(sensor_id, ip=remote_addr)
+        node.ip = node.ip or remote_addr # Sensors first seen through an alert have no address yet
+        node.last_seen = seen_at
+        node.status = "online"
+        node.metrics = metrics
+        return {"id": node.id, "ip": node.ip, "trust": node.trust_score, "status": node.status,
+                "last_seen": seen_at.isoformat(), "metrics": json.loads(metrics)}
+    # Same shape as an /api/nodes entry, published once the change is committed
+    db_writer.submit(update_node).add_done_callback(
+        lambda f: f.exception() is None and events.publish("sensor", f.result()))
     
     return jsonify({"status": "ok"}), 200
     
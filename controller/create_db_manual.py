@@ -23,7 +23,8 @@ CREATE TABLE IF NOT EXISTS sensor_node (
     ip VARCHAR(50),
     trust_score REAL DEFAULT 50.0,
     last_seen DATETIME,
-    status VARCHAR(20) DEFAULT 'offline'
+    status VARCHAR(20) DEFAULT 'offline',
+    metrics TEXT
 )
 ''')
 print("✅ Table checked/created: sensor_node")
@@ -35,12 +36,23 @@ CREATE TABLE IF NOT EXISTS alert (
     sensor_id VARCHAR(50),
     source_ip VARCHAR(50),
     score REAL,
+    suppressed INTEGER DEFAULT 0,
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (sensor_id) REFERENCES sensor_node(id)
 )
 ''')
 print("✅ Table checked/created: alert")
 
+# Upgrade older databases in place
+def add_column(table, column, definition):
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"✅ Column added: {table}.{column}")
+
+add_column("alert", "suppressed", "INTEGER DEFAULT 0")
+add_column("sensor_node", "metrics", "TEXT")
+
 # Create block_event table
 cursor.execute('''
 CREATE TABLE IF NOT EXISTS block_event (
@@ -53,9 +65,35 @@ CREATE TABLE IF NOT EXISTS block_event (
 ''')
 print("✅ Table checked/created: block_event")
 
+# Hourly per-IP rollup of alerts past the retention window (see retention.py)
+cursor.execute('''
+CREATE TABLE IF NOT EXISTS alert_hourly (
+    source_ip VARCHAR(50) NOT NULL,
+    hour DATETIME NOT NULL,
+    alert_count INTEGER NOT NULL DEFAULT 0,
+    score_sum REAL NOT NULL DEFAULT 0,
+    score_max REAL NOT NULL DEFAULT 0,
+    suppressed_sum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (source_ip, hour)
+)
+''')
+print("✅ Table checked/created: alert_hourly")
+
+# Indexes for the per-IP history, time range, per-sensor and offense count lookups
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_alert_source_ip_timestamp ON alert (source_ip, timestamp)")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_alert_timestamp ON alert (timestamp)")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_alert_sensor_id_timestamp ON alert (sensor_id, timestamp)")
+cursor.execute("CREATE INDEX IF NOT EXISTS ix_block_event_ip ON block_event (ip)")
+print("✅ Indexes checked/created")
+
 # Commit and verify
 conn.commit()
 
+# WAL lets the dashboard read while alerts are being written (persists in the file)
+mode = cursor.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+cursor.execute("ANALYZE")
+print(f"✅ Journal mode: {mode}")
+
 # Show all tables
 cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
 tables = cursor.fetchall()
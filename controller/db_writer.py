@@ -0,0 +1,141 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db
+
+logger = logging.getLogger("NIDS_Controller.DbWriter")
+
+class DbWriter:
+    """
+    Single writer thread that group-commits database changes.
+
+    submit(fn) queues fn, which adds/updates rows on db.session. The writer
+    runs everything that arrives within `max_delay` seconds (or `max_batch`
+    operations) in one transaction, so a burst of alerts and heartbeats
+    costs one commit (one fsync, one write lock) instead of one each.
+    The returned Future resolves once the change is committed; wait on it
+    only when the caller needs durability. Committed inserts are added to
+    `counters` (RowCounters), if given.
+    """
+    def __init__(self, app, max_batch=500, max_delay=0.005, capacity=10000, counters=None):
+        self.app = app
+        self.counters = counters
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue(maxsize=capacity)
+        self.lock = threading.Lock()
+        self.commits = 0
+        self.records = 0
+        self.failed = 0
+        self.largest_batch = 0
+        self.commit_times = deque(maxlen=10000)
+        self.inserted = Counter() # New rows per table in the open transaction
+        if counters is not None:
+            event.listen(Session, "after_flush", self._on_flush)
+        self.thread = threading.Thread(target=self._run, daemon=True, name="db-writer")
+        self.thread.start()
+
+    def submit(self, fn, wait=False, timeout=10):
+        """
+        Queues fn() to run inside the next transaction. Returns a Future, or
+        with wait=True blocks until committed (re-raising any DB error).
+        """
+        future = Future()
+        self.queue.put((fn, future))
+        if wait:
+            future.result(timeout)
+        return future
+
+    def flush(self, timeout=10):
+        """Blocks until everything submitted so far is committed."""
+        self.submit(lambda: None, wait=True, timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(batch)
+
+    def _commit(self, batch):
+        t0 = time.perf_counter()
+        with self.app.app_context():
+            try:
+                self.inserted.clear()
+                results = [fn() for fn, _ in batch]
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Group commit of {len(batch)} changes failed ({e}), retrying one by one")
+                self._commit_each(batch)
+                return
+        self._count()
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+        self._record(len(batch), time.perf_counter() - t0)
+
+    def _commit_each(self, batch):
+        """Isolates the change that broke a group commit; the rest still land."""
+        t0 = time.perf_counter()
+        failed = 0
+        for fn, future in batch:
+            try:
+                self.inserted.clear()
+                result = fn()
+                db.session.commit()
+                self._count()
+                future.set_result(result)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Database write failed: {e}")
+                future.set_exception(e)
+                failed += 1
+        with self.lock:
+            self.failed += failed
+        self._record(len(batch) - failed, time.perf_counter() - t0)
+
+    def _on_flush(self, session, flush_context):
+        if threading.current_thread() is self.thread:
+            self.inserted.update(obj.__tablename__ for obj in session.new)
+
+    def _count(self):
+        """Hands the committed inserts to the row counters."""
+        if self.counters is not None:
+            for table, n in self.inserted.items():
+                self.counters.add(table, n)
+        self.inserted.clear()
+
+    def _record(self, records, seconds):
+        with self.lock:
+            self.commits += 1
+            self.records += records
+            self.largest_batch = max(self.largest_batch, records)
+            self.commit_times.append(seconds)
+
+    def metrics(self):
+        with self.lock:
+            ordered = sorted(self.commit_times)
+            p99 = ordered[min(len(ordered) - 1, int(round(0.99 * (len(ordered) - 1))))] * 1000 if ordered else 0.0
+            return {
+                "pending": self.queue.qsize(),
+                "commits": self.commits,
+                "records": self.records,
+                "records_per_commit": self.records / self.commits if self.commits else 0.0,
+                "largest_batch": self.largest_batch,
+                "failed": self.failed,
+                "commit_p99_ms": p99
+            }
@@ -1,18 +1,20 @@
+import ipaddress
 import logging
+import os
 import subprocess
+import threading
+import time
 
 # Use child logger - inherits handlers from parent "NIDS_Controller"
 logger = logging.getLogger("NIDS_Controller.Enforcement")
 
-def calculate_ban_duration(ip,app):
+IPSET_NAME = "blacklist" # Matched by the iptables DROP rules from start_router.sh
+IPSET6_NAME = "blacklist6" # IPv6 sources (a hash:ip set holds one address family), ip6tables rules
+
+def ban_duration(offense_count):
     """
     Returns seconds to ban based on repeat offenses (previous blocks).
     """
-    with app.app_context():
-        from models import BlockEvent
-        # Count how many times this IP has been blocked before
-        offense_count = BlockEvent.query.filter_by(ip=ip).count()
-
     # offense_count is previous blocks.
     # 0 prev blocks = 1st offense
     # 1 prev block = 2nd offense
@@ -24,26 +26,179 @@ def calculate_ban_duration(ip,app):
     else:
         return 86400    # 24 Hours (Maximum Penalty)
 
-def enforce_block(ip, threat_info, whitelist, app):
-    """Executes the actual firewall block using ipset/iptables"""
-    if ip in whitelist:
-        logger.warning(f"CRITICAL: Attempted to block Whitelisted IP {ip}. Action Aborted.")
-        return
+class Enforcer:
+    """
+    Batched firewall enforcement.
+
+    block() decides immediately (whitelist, already-blocked, ban duration
+    from the cached offense count) and queues the ipset entry; a flusher
+    thread applies everything queued within `flush_interval` seconds with a
+    single `ipset restore`, instead of one sudo/ipset process per verdict.
+    If the restore fails, the batch is queued again and retried with
+    backoff (each ban with whatever time it has left), so the firewall
+    catches up with the bans already decided. backend "dry-run" logs the
+    restore script instead of running it, so this works without root.
+    """
+    def __init__(self, app, backend="ipset", flush_interval=0.2):
+        self.app = app
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.blocked = {}   # ip -> expiry (epoch seconds) of the active ban
+        self.offenses = {}  # ip -> previous blocks (BlockEvent rows)
+        self.pending = []   # ("add"/"del", ip, expiry) waiting for the next flush
+        self.set_ready = False
+        self.flushes = 0
+        self.applied = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_script = ""
+        self._load()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="enforcer")
+        self.thread.start()
+
+    def _load(self):
+        """Offense counts and bans still in force, from block_event (one query each)."""
+        from models import db, BlockEvent
+        from datetime import datetime
+        try:
+            with self.app.app_context():
+                counts = db.session.query(BlockEvent.ip, db.func.count(BlockEvent.id)).group_by(BlockEvent.ip).all()
+                active = BlockEvent.query.filter(BlockEvent.expires_at > datetime.utcnow()).all()
+        except Exception as e:
+            logger.warning(f"Could not load block history ({e}), starting with none")
+            return
+        self.offenses = {ip: n for ip, n in counts}
+        offset = time.time() - datetime.utcnow().timestamp()
+        for event in active:
+            expiry = event.expires_at.timestamp() + offset
+            self.blocked[event.ip] = max(expiry, self.blocked.get(event.ip, 0))
+        logger.info(f"Loaded block history: {len(self.offenses)} IPs, {len(self.blocked)} bans in force")
+
+    def block(self, ip, threat_info, whitelist):
+        """
+        Queues a ban. Returns (duration, offense_number), or None when the IP
+        is whitelisted or already blocked.
+        """
+        if ip in whitelist:
+            logger.warning(f"CRITICAL: Attempted to block Whitelisted IP {ip}. Action Aborted.")
+            return None
+        try:
+            ipaddress.ip_address(ip)
+        except ValueError:
+            # One bad line would fail the whole restore transaction
+            logger.error(f"Refusing to block invalid address {ip!r}")
+            return None
+
+        now = time.time()
+        with self.lock:
+            if self.blocked.get(ip, 0) > now:
+                self.skipped += 1
+                return None
+            # 1. Calculate Duration
+            offense_count = self.offenses.get(ip, 0)
+            duration = ban_duration(offense_count)
+            self.offenses[ip] = offense_count + 1
+            self.blocked[ip] = now + duration
+            # 2. Queue the ipset entry for the next flush
+            self.pending.append(("add", ip, now + duration))
+        self.wake.set()
+
+        logger.info(f"⚔️ BLOCKING {ip} for {duration} seconds (Offense #{offense_count + 1})")
+        return duration, offense_count + 1
+
+    def unblock(self, ip):
+        """
+        Lifts a ban and forgets the IP's offense history (its BlockEvents are
+        deleted). Returns True if a ban was still in force.
+        """
+        with self.lock:
+            active = self.blocked.pop(ip, 0) > time.time()
+            self.offenses.pop(ip, None)
+            self.pending.append(("del", ip, None))
+        self.wake.set()
+        return active
+
+    def active_bans(self):
+        """{ip: expiry (epoch seconds)} of the bans still in force."""
+        now = time.time()
+        with self.lock:
+            return {ip: t for ip, t in self.blocked.items() if t > now}
+
+    def is_blocked(self, ip):
+        with self.lock:
+            return self.blocked.get(ip, 0) > time.time()
 
-    # 1. Calculate Duration
-    duration = calculate_ban_duration(ip,app)
+    def flush(self):
+        """
+        Applies every queued change in one ipset restore transaction.
+        Returns False if it failed (the changes stay queued).
+        """
+        with self.lock:
+            entries, self.pending = self.pending, []
+            # Expired bans have already left the ipset (entry timeout)
+            now = time.time()
+            if len(self.blocked) > 1000:
+                self.blocked = {ip: t for ip, t in self.blocked.items() if t > now}
+        if not entries:
+            return True
+        lines = []
+        if not self.set_ready:
+            lines.append(f"create {IPSET_NAME} hash:ip timeout 300 -exist")
+            lines.append(f"create {IPSET6_NAME} hash:ip family inet6 timeout 300 -exist")
+        for op, ip, expiry in entries:
+            name = IPSET6_NAME if ipaddress.ip_address(ip).version == 6 else IPSET_NAME
+            if op == "del":
+                lines.append(f"del {name} {ip} -exist")
+            elif expiry - now >= 1: # A retried ban only gets the time it has left
+                lines.append(f"add {name} {ip} timeout {int(expiry - now)} -exist")
+        script = "\n".join(lines) + "\n"
+        self.last_script = script
 
-    with app.app_context():
-        from models import BlockEvent
-        offense_count = BlockEvent.query.filter_by(ip=ip).count()
+        if self.backend == "dry-run":
+            logger.info(f"[DRY RUN] ipset restore:\n{script.rstrip()}")
+            ok = True
+        else:
+            cmd = ["ipset", "restore", "-exist"]
+            if os.geteuid() != 0:
+                cmd = ["sudo", "-n"] + cmd # Needs the sudoers entry from the README, never prompts
+            try:
+                subprocess.run(cmd, input=script, text=True, check=True, capture_output=True, timeout=10)
+                ok = True
+            except Exception as e:
+                stderr = getattr(e, "stderr", None)
+                logger.error(f"Failed to execute block: {e}{f' ({stderr.strip()})' if stderr else ''}, {len(entries)} changes queued for retry")
+                ok = False
 
-    logger.info(f"⚔️ BLOCKING {ip} for {duration} seconds (Offense #{offense_count + 1})")
+        with self.lock:
+            self.flushes += 1
+            if ok:
+                self.set_ready = True
+                self.applied += len(entries)
+            else:
+                self.failures += 1
+                self.set_ready = False # Re-create the sets next time, in case they were missing
+                self.pending = entries + self.pending # Keep the order: a later unblock must still win
+        return ok
 
-    # 2. Pass duration to the script
-    try:
-        # Note: block_ip.sh must be in the same directory as the runner
-        subprocess.run(["sudo", "./block_ip.sh", ip, str(duration)], check=True)
-        #  logger.info(f"called block_ip.sh for {ip} for {duration} seconds")
+    def _run(self):
+        backoff = 0
+        while True:
+            self.wake.wait(backoff or None) # After a failure, retry even if nothing new arrives
+            time.sleep(self.flush_interval) # Let a burst of verdicts pile up
+            self.wake.clear()
+            backoff = 0 if self.flush() else min(max(backoff * 2, 1), 30)
 
-    except Exception as e:
-        logger.error(f"Failed to execute block: {e}")
+    def metrics(self):
+        now = time.time()
+        with self.lock:
+            return {
+                "backend": self.backend,
+                "blocked": sum(1 for t in self.blocked.values() if t > now),
+                "pending": len(self.pending),
+                "flushes": self.flushes,
+                "applied": self.applied,
+                "skipped_already_blocked": self.skipped,
+                "failures": self.failures
+            }
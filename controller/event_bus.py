@@ -0,0 +1,98 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+class Subscription:
+    """One stream client: a bounded queue of encoded events."""
+    def __init__(self, capacity):
+        self.queue = queue.Queue(maxsize=capacity)
+        self.lagged = False # Events were dropped, the client must re-read its snapshot
+
+class EventBus:
+    """
+    In-process pub/sub for the dashboard's live feed (/api/stream).
+
+    publish() encodes an event once and hands it to every subscriber without
+    blocking: a client that can't keep up loses events and is told to
+    resync, instead of slowing down the alert path. The last `history`
+    events are kept so a reconnecting client (Last-Event-ID) only gets
+    what it missed.
+    """
+    def __init__(self, client_capacity=1000, history=1000, max_clients=50):
+        self.client_capacity = client_capacity
+        self.max_clients = max_clients
+        self.epoch = str(int(time.time())) # Event ids restart with the controller
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, event, data):
+        with self.lock:
+            self.seq += 1
+            event_id = f"{self.epoch}-{self.seq}"
+            message = f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            self.history.append((self.seq, message))
+            self.published += 1
+            for sub in self.subscribers:
+                try:
+                    sub.queue.put_nowait(message)
+                except queue.Full:
+                    sub.lagged = True
+                    self.dropped += 1
+
+    def subscribe(self, last_event_id=None):
+        """
+        Returns a Subscription (None when max_clients are connected), pre-filled
+        with the events after `last_event_id` or flagged lagged if those
+        are no longer in the history.
+        """
+        sub = Subscription(self.client_capacity)
+        with self.lock:
+            if len(self.subscribers) >= self.max_clients:
+                return None
+            if last_event_id:
+                epoch, _, seq = last_event_id.partition("-")
+                missed = [m for s, m in self.history if epoch == self.epoch and seq.isdigit() and s > int(seq)]
+                oldest = self.history[0][0] if self.history else self.seq + 1
+                if epoch != self.epoch or not seq.isdigit() or int(seq) + 1 < oldest or len(missed) > self.client_capacity:
+                    sub.lagged = True
+                else:
+                    for message in missed:
+                        sub.queue.put_nowait(message)
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscribers.discard(sub)
+
+    def stream(self, sub, keepalive=15):
+        """Yields text/event-stream chunks for `sub` until the client disconnects."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                if sub.lagged:
+                    with self.lock:
+                        sub.lagged = False
+                        while not sub.queue.empty():
+                            sub.queue.get_nowait()
+                    yield "event: resync\ndata: {}\n\n"
+                try:
+                    yield sub.queue.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keepalive\n\n" # Also how a closed connection gets noticed
+        finally:
+            self.unsubscribe(sub)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "clients": len(self.subscribers),
+                "published": self.published,
+                "dropped": self.dropped
+            }
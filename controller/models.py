@@ -9,6 +9,7 @@ class SensorNode(db.Model):
     trust_score = db.Column(db.Float, default=50.0)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default="offline")
+    metrics = db.Column(db.Text, nullable=True) # Latest heartbeat metrics (JSON)
     
 class Alert(db.Model):
     __tablename__ = 'alert'
@@ -16,13 +17,51 @@ class Alert(db.Model):
     sensor_id = db.Column(db.String(50), db.ForeignKey('sensor_node.id'))
     source_ip = db.Column(db.String(50))
     score = db.Column(db.Float)
+    suppressed = db.Column(db.Integer, default=0) # Hits the sensor rate limited since its previous alert
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_alert_source_ip_timestamp', 'source_ip', 'timestamp'),
+        db.Index('ix_alert_timestamp', 'timestamp'),
+        db.Index('ix_alert_sensor_id_timestamp', 'sensor_id', 'timestamp'),
+    )
+
+class AlertHourly(db.Model):
+    """Per-IP hourly rollup of alerts older than the retention window."""
+    __tablename__ = 'alert_hourly'
+    source_ip = db.Column(db.String(50), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    alert_count = db.Column(db.Integer, default=0)
+    score_sum = db.Column(db.Float, default=0.0)
+    score_max = db.Column(db.Float, default=0.0)
+    suppressed_sum = db.Column(db.Integer, default=0)
+
 class BlockEvent(db.Model):
     __tablename__ = 'block_event'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    ip = db.Column(db.String(50))
+    ip = db.Column(db.String(50), index=True)
     reason = db.Column(db.String(100))
     blocked_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime, nullable=True)
-    
\ No newline at end of file
+    
+def get_or_create_sensor(sensor_id, **defaults):
+    """Returns the SensorNode row, adding it to the session if it doesn't exist yet."""
+    sensor = db.session.get(SensorNode, sensor_id)
+    if sensor is None:
+        sensor = SensorNode(id=sensor_id, **defaults)
+        db.session.add(sensor)
+    return sensor
+
+def configure_sqlite(engine):
+    """Sets the per-connection SQLite pragmas on every new pooled connection."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")     # readers don't block the writer
+        cursor.execute("PRAGMA synchronous=NORMAL")   # safe with WAL, far fewer fsyncs
+        cursor.execute("PRAGMA busy_timeout=5000")    # wait for the write lock instead of failing
+        cursor.execute("PRAGMA cache_size=-16000")    # 16 MB page cache
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
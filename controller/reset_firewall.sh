@@ -3,6 +3,7 @@ echo "🧹 RESETTING FIREWALL..."
 
 # Flush the blacklist (Unban everyone)
 sudo ipset flush blacklist
+sudo ipset flush blacklist6 2>/dev/null
 
 # Clear iptables rules (Optional - cautious)
 # sudo iptables -F
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from models import db
+
+logger = logging.getLogger("NIDS_Controller.Retention")
+
+ROLLUP_SQL = text("""
+INSERT INTO alert_hourly (source_ip, hour, alert_count, score_sum, score_max, suppressed_sum)
+SELECT source_ip, strftime('%Y-%m-%d %H:00:00.000000', timestamp), COUNT(*), SUM(score), MAX(score),
+       SUM(COALESCE(suppressed, 0))
+FROM alert
+WHERE timestamp >= :start AND timestamp < :end
+GROUP BY source_ip, strftime('%Y-%m-%d %H:00:00.000000', timestamp)
+ON CONFLICT (source_ip, hour) DO UPDATE SET
+    alert_count = alert_count + excluded.alert_count,
+    score_sum = score_sum + excluded.score_sum,
+    score_max = MAX(score_max, excluded.score_max),
+    suppressed_sum = suppressed_sum + excluded.suppressed_sum
+""")
+DELETE_SQL = text("DELETE FROM alert WHERE timestamp >= :start AND timestamp < :end")
+
+OLDEST_SQL = text("SELECT MIN(timestamp) FROM alert WHERE timestamp >= :start AND timestamp < :end")
+
+def _db_time(value):
+    """
+    Text bound for comparing against alert.timestamp. SQLAlchemy stores
+    '%Y-%m-%d %H:%M:%S.%f' but CURRENT_TIMESTAMP rows have no microseconds;
+    a bound without them sorts before both forms of the same second, so
+    whole-second bounds compare right against either (and keep the index).
+    """
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+class RetentionJob:
+    """
+    Background thread that rolls alerts older than `days` into per-IP hourly
+    totals (alert_hourly) and deletes the raw rows, one day of alerts per
+    transaction so the write lock is never held for long. Deleted rows are
+    taken off `counters` (RowCounters), if given.
+    """
+    def __init__(self, app, days=30, interval=3600, min_age_seconds=0, counters=None):
+        self.app = app
+        self.counters = counters
+        # Never touch alerts the verification window still counts
+        self.max_age = max(timedelta(days=days), timedelta(seconds=min_age_seconds))
+        self.interval = interval
+        self.rolled_up = 0
+        self.runs = 0
+        self.last_run = None
+        self.thread = threading.Thread(target=self._run, daemon=True, name="alert-retention")
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run_once(self, now=None):
+        """Rolls up everything older than the retention window. Returns the number of alerts removed."""
+        cutoff = ((now or datetime.utcnow()) - self.max_age).replace(microsecond=0)
+        removed = 0
+        after = "" # Sorts before every timestamp
+        with self.app.app_context():
+            while True:
+                # Jump to the oldest alert still inside the window instead of walking empty days
+                oldest = db.session.execute(OLDEST_SQL, {"start": after, "end": _db_time(cutoff)}).scalar()
+                if oldest is None:
+                    break
+                start = datetime.strptime(oldest[:13], '%Y-%m-%d %H')
+                end = min(start + timedelta(days=1), cutoff)
+                params = {"start": _db_time(start), "end": _db_time(end)}
+                db.session.execute(ROLLUP_SQL, params)
+                deleted = db.session.execute(DELETE_SQL, params).rowcount
+                db.session.commit()
+                if self.counters is not None:
+                    self.counters.remove('alert', deleted)
+                removed += deleted
+                after = params["end"]
+            if removed:
+                db.session.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+                db.session.execute(text("PRAGMA optimize"))
+        self.rolled_up += removed
+        self.runs += 1
+        self.last_run = datetime.utcnow()
+        if removed:
+            logger.info(f"🗄️ Rolled {removed} alerts older than {cutoff:%Y-%m-%d %H:%M} into hourly totals")
+        return removed
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Alert retention failed: {e}")
+            time.sleep(self.interval)
+
+    def metrics(self):
+        return {
+            "retention_days": self.max_age.days,
+            "rolled_up": self.rolled_up,
+            "runs": self.runs,
+            "last_run": self.last_run.isoformat() if self.last_run else None
+        }
@@ -0,0 +1,44 @@
+import logging
+import threading
+
+from sqlalchemy import text
+
+from models import db
+
+logger = logging.getLogger("NIDS_Controller.RowCounters")
+
+class RowCounters:
+    """
+    Row counts per table, counted once at startup and then kept up to date
+    by the write path (DbWriter inserts, unban and retention deletes), so
+    /api/status never runs COUNT(*). Each table also has a version that
+    changes with every write, used as the ETag of API responses.
+    """
+    def __init__(self, app, tables):
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(tables, 0)
+        self.versions = dict.fromkeys(tables, 0)
+        try:
+            with app.app_context():
+                for table in tables:
+                    self.counts[table] = db.session.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+        except Exception as e:
+            logger.warning(f"Could not count rows ({e}), starting from zero")
+
+    def add(self, table, n=1):
+        if not n:
+            return
+        with self.lock:
+            self.counts[table] = self.counts.get(table, 0) + n
+            self.versions[table] = self.versions.get(table, 0) + 1
+
+    def remove(self, table, n=1):
+        self.add(table, -n)
+
+    def count(self, table):
+        with self.lock:
+            return self.counts.get(table, 0)
+
+    def version(self, table):
+        with self.lock:
+            return self.versions.get(table, 0)
@@ -23,8 +23,10 @@ sudo iptables -t nat -A POSTROUTING -o $WAN_IF -j MASQUERADE
 echo "🛡️  Initializing Firewall (ipset)..."
 # Create the blacklist set if it doesn't exist
 sudo ipset create blacklist hash:ip timeout 300 -exist
+sudo ipset create blacklist6 hash:ip family inet6 timeout 300 -exist
 # Flush old rules to start fresh
 sudo ipset flush blacklist
+sudo ipset flush blacklist6
 # Link ipset to iptables (Drop traffic from blacklisted IPs)
 # Check if rule exists first to avoid duplicates
 sudo iptables -C INPUT -m set --match-set blacklist src -j DROP 2>/dev/null
@@ -32,6 +34,11 @@ if [ $? -ne 0 ]; then
     sudo iptables -I INPUT -m set --match-set blacklist src -j DROP
     sudo iptables -I FORWARD -m set --match-set blacklist src -j DROP
 fi
+sudo ip6tables -C INPUT -m set --match-set blacklist6 src -j DROP 2>/dev/null
+if [ $? -ne 0 ]; then
+    sudo ip6tables -I INPUT -m set --match-set blacklist6 src -j DROP
+    sudo ip6tables -I FORWARD -m set --match-set blacklist6 src -j DROP
+fi
 
 # --- 3. Start the Controller ---
 echo "🧠 Starting Python Controller..."
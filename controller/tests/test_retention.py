@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import event, text
+
+from models import db
+from retention import RetentionJob
+
+NOW = datetime(2020, 3, 1, 12, 0, 0)
+
+def make_app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+def insert(app, *timestamps):
+    with app.app_context():
+        for ts in timestamps:
+            db.session.execute(text("INSERT INTO alert (source_ip, score, suppressed, timestamp) VALUES ('10.0.0.1', -0.5, 0, :ts)"), {"ts": ts})
+        db.session.commit()
+
+def remaining(app):
+    with app.app_context():
+        return [row[0] for row in db.session.execute(text("SELECT timestamp FROM alert ORDER BY timestamp"))]
+
+def test_rolls_up_mixed_timestamp_formats():
+    """Rows written by CURRENT_TIMESTAMP have no microseconds and must still be rolled up."""
+    app = make_app()
+    insert(app,
+           "2020-01-01 00:00:00",          # CURRENT_TIMESTAMP format, exactly on a chunk start
+           "2020-01-01 00:00:00.000000",   # SQLAlchemy format, same instant
+           "2020-01-02 00:00:00",          # Exactly on the next chunk boundary
+           "2020-01-15 08:30:00.250000",
+           "2020-01-31 11:59:59",          # Just before the cutoff
+           "2020-01-31 12:00:00",          # On the cutoff: kept
+           "2020-02-20 00:00:00.000000")   # Inside the retention window: kept
+    job = RetentionJob(app, days=30)
+    assert job.run_once(now=NOW) == 5
+    assert remaining(app) == ["2020-01-31 12:00:00", "2020-02-20 00:00:00.000000"]
+    with app.app_context():
+        hourly = dict(db.session.execute(text("SELECT hour, alert_count FROM alert_hourly")).all())
+    assert hourly == {
+        "2020-01-01 00:00:00.000000": 2,
+        "2020-01-02 00:00:00.000000": 1,
+        "2020-01-15 08:00:00.000000": 1,
+        "2020-01-31 11:00:00.000000": 1,
+    }
+    # Nothing left inside the window: a second run finds no work
+    assert job.run_once(now=NOW) == 0
+
+def test_skips_empty_days():
+    """The loop starts at the oldest row in the window, not at MIN(timestamp) of old leftovers."""
+    app = make_app()
+    insert(app, "2015-06-01 10:00:00.000000", "2020-01-20 10:00:00")
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert RetentionJob(app, days=30).run_once(now=NOW) == 2
+    deletes = [s for s in statements if s.startswith("DELETE FROM alert")]
+    assert len(deletes) == 2
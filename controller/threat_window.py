@@ -0,0 +1,70 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+class ThreatWindow:
+    """
+    Per-IP sliding window of alert scores over the last `ttl_seconds`.
+
+    Each IP keeps its alerts in time order with a running sum: adding one
+    appends, expiry pops from the front, so total() is O(1) amortized and
+    equals summing the alert table over the same window. Idle IPs are
+    swept every `sweep_every` adds so spoofed sources can't pile up.
+    """
+    def __init__(self, ttl_seconds=3600, sweep_every=1000):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.sweep_every = sweep_every
+        self.windows = {}  # ip -> [deque of (timestamp, score), running sum]
+        self.lock = threading.Lock()
+        self.adds = 0
+
+    def __len__(self):
+        return len(self.windows)
+
+    def _expire(self, ip, window, cutoff):
+        alerts = window[0]
+        while alerts and alerts[0][0] < cutoff:
+            window[1] -= alerts.popleft()[1]
+        if not alerts:
+            window[1] = 0.0  # Drop float drift once the window is empty
+            del self.windows[ip]
+
+    def total(self, ip, now=None):
+        """Sum of scores for `ip` since now - ttl."""
+        now = now or datetime.utcnow()
+        with self.lock:
+            window = self.windows.get(ip)
+            if window is None:
+                return 0.0
+            self._expire(ip, window, now - self.ttl)
+            return window[1]
+
+    def add(self, ip, score, timestamp):
+        """Records an alert. Alerts must arrive in (roughly) time order."""
+        with self.lock:
+            window = self.windows.get(ip)
+            if window is None:
+                window = self.windows[ip] = [deque(), 0.0]
+            window[0].append((timestamp, score))
+            window[1] += score
+            self.adds += 1
+            if self.adds % self.sweep_every == 0:
+                cutoff = timestamp - self.ttl
+                for other in list(self.windows):
+                    self._expire(other, self.windows[other], cutoff)
+
+    def rebuild(self, rows, now=None):
+        """Refills the window from (ip, score, timestamp) rows, e.g. the alert table at startup."""
+        cutoff = (now or datetime.utcnow()) - self.ttl
+        with self.lock:
+            self.windows.clear()
+        for ip, score, timestamp in sorted(rows, key=lambda r: r[2]):
+            if timestamp is not None and timestamp >= cutoff:
+                self.add(ip, score or 0.0, timestamp)
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "tracked_ips": len(self.windows),
+                "alerts_in_window": sum(len(w[0]) for w in self.windows.values())
+            }
@@ -1,64 +1,105 @@
 import logging
 from datetime import datetime, timedelta
-from enforcement import enforce_block
-from models import db, SensorNode, Alert, BlockEvent # [NEW]
+import threading
+from models import db, SensorNode, Alert, BlockEvent, get_or_create_sensor # [NEW]
+from threat_window import ThreatWindow
 
 # Use child logger - inherits handlers from parent "NIDS_Controller"
 logger = logging.getLogger("NIDS_Controller.Verification")
 
 class VerificationEngine:
-    def __init__(self, config,app):
+    def __init__(self, config,app, writer, enforcer, events=None):
         self.config = config
         self.app = app # [NEW] Need app context for DB
+        self.writer = writer # All inserts/updates go through the group-commit DbWriter
+        self.enforcer = enforcer # Batched ipset blocks + cache of active bans
+        self.events = events # EventBus feeding the dashboard's live stream (optional)
+        self.trust = {} # sensor_id -> trust score, filled on first alert
+        self.lock = threading.Lock()
+        # Recent alert scores per IP, so verdicts don't re-read the alert table
+        self.window = ThreatWindow(config.get('HISTORY_TTL_SECONDS', 3600))
+        self.rebuild_window()
 
-    def process_threat(self, sensor_id, ip, raw_score):
+    def rebuild_window(self):
+        """Loads the alerts still inside the history window, so verdicts survive restarts."""
+        cutoff = datetime.utcnow() - self.window.ttl
+        try:
+            with self.app.app_context():
+                rows = db.session.query(Alert.source_ip, Alert.score, Alert.timestamp).filter(
+                    Alert.timestamp >= cutoff
+                ).all()
+        except Exception as e:
+            logger.warning(f"Could not load alert history ({e}), starting with an empty window")
+            return
+        self.window.rebuild(rows)
+        logger.info(f"Loaded {len(rows)} recent alerts for {len(self.window)} IPs")
+
+    def sensor_trust(self, sensor_id):
         """
-        Decides if a threat is real.
+        Trust score of a sensor, read from the DB once and kept in memory.
+        Unknown sensors are registered with the default trust.
         """
+        with self.lock:
+            trust = self.trust.get(sensor_id)
+        if trust is not None:
+            return trust
         with self.app.app_context():
-            # 1. Initialize Trust if new sensor
-            sensor = SensorNode.query.get(sensor_id)
-            if not sensor:
-                sensor = SensorNode(id=sensor_id,trust_score=50.0)
-                db.session.add(sensor)
-                db.session.commit()
-
-            current_trust = sensor.trust_score
-
-            new_alert = Alert(sensor_id = sensor_id,source_ip = ip, score= raw_score)
-            db.session.add(new_alert)
+            sensor = db.session.get(SensorNode, sensor_id)
+            trust = sensor.trust_score if sensor and sensor.trust_score is not None else 50.0
+        if sensor is None:
+            self.writer.submit(lambda: get_or_create_sensor(sensor_id, trust_score=50.0))
+        with self.lock:
+            self.trust[sensor_id] = trust
+        return trust
 
-            # 3. Calculate cumulative threat from recent alerts (last 1 hour)
-            # We filter out the current alert (new_alert) to avoid double counting,
-            # as we add its weighted score separately.
-            cutoff_time = datetime.utcnow() - timedelta(hours=1)
-            recent_alerts = Alert.query.filter(
-                Alert.source_ip == ip,
-                Alert.timestamp >= cutoff_time
-            ).all()
+    def process_threat(self, sensor_id, ip, raw_score, suppressed=0):
+        """
+        Decides if a threat is real.
+        suppressed: hits the sensor rate limited since its previous alert for this IP.
+        The verdict only reads in-memory state; rows go through the group-commit writer.
+        """
+        # 1. Initialize Trust if new sensor
+        current_trust = self.sensor_trust(sensor_id)
 
-            # Exclude the current alert we just added from the cumulative sum
-            past_alerts = [a for a in recent_alerts if a is not new_alert]
-            cumulative_score = sum([a.score for a in past_alerts])
+        now = datetime.utcnow()
+        self.writer.submit(lambda: db.session.add(Alert(
+            sensor_id = sensor_id, source_ip = ip, score = raw_score, suppressed = suppressed, timestamp = now)))
 
-            # Apply trust weighting to current alert
-            weighted_impact = raw_score * (current_trust / 100.0)
-            total_threat = cumulative_score + weighted_impact
+        # 3. Calculate cumulative threat from recent alerts (last HISTORY_TTL_SECONDS)
+        # The current alert isn't in the window yet, so it isn't double counted:
+        # its weighted score is added separately.
+        cumulative_score = self.window.total(ip, now)
+        self.window.add(ip, raw_score, now)
 
-            logger.info(f"Analysis: IP={ip} | Threat={total_threat:.2f} | ReportedBy={sensor_id} (Trust: {current_trust})")
+        # Apply trust weighting to current alert
+        weighted_impact = raw_score * (current_trust / 100.0)
+        total_threat = cumulative_score + weighted_impact
 
-            # 4. The Verdict
-            if total_threat > self.config['BLOCK_THRESHOLD']:
-                enforce_block(ip, {"score": total_threat}, self.config['WHITELIST'],self.app)
+        logger.info(f"Analysis: IP={ip} | Threat={total_threat:.2f} | ReportedBy={sensor_id} (Trust: {current_trust}) | Suppressed={suppressed}")
+        if self.events:
+            self.events.publish("alert", {
+                "sensor": sensor_id, "ip": ip, "score": raw_score, "suppressed": suppressed,
+                "time": now.isoformat(), "threat": total_threat
+            })
 
-                # Record in database
-                block_event = BlockEvent(ip=ip, reason=f"Threat Score: {total_threat:.2f}")
-                db.session.add(block_event)
+        # 4. The Verdict
+        if total_threat > self.config['BLOCK_THRESHOLD']:
+            # None: whitelisted, or still serving an earlier ban
+            ban = self.enforcer.block(ip, {"score": total_threat}, self.config['WHITELIST'])
+            if ban is None:
+                return
 
-                logger.info(f"[SYSTEM] [BLOCK] {ip} blocked (Score: {total_threat:.2f})")
+            # Record in database (offense counts are tracked by the enforcer)
+            reason = f"Threat Score: {total_threat:.2f}"
+            expires_at = now + timedelta(seconds=ban[0])
+            self.writer.submit(lambda: db.session.add(BlockEvent(ip=ip, reason=reason, expires_at=expires_at)))
+            if self.events:
+                self.events.publish("block", {
+                    "ip": ip, "reason": reason, "duration": ban[0], "offense": ban[1],
+                    "time": now.isoformat(), "expires_at": expires_at.isoformat()
+                })
 
-            # Commit all changes
-            db.session.commit()
+            logger.info(f"[SYSTEM] [BLOCK] {ip} blocked (Score: {total_threat:.2f})")
 
     def get_trust_scores(self):
         """Returns all sensor trust scores from DB"""
@@ -0,0 +1,104 @@
+import time
+
+class AdaptiveBatcher:
+    """
+    Micro-batcher for the scoring loop.
+    A batch is flushed when it reaches the target size or when its oldest
+    packet has waited max_latency seconds, whichever comes first. The target
+    size follows the observed arrival rate and scoring time: quiet links get
+    small, prompt batches and busy links get large ones that amortize the
+    model call.
+    """
+    def __init__(self, initial_size=10, min_size=1, max_size=4096, max_latency=0.05, smoothing=0.3):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.max_latency = max_latency
+        self.smoothing = smoothing
+        self.target = self._clamp(initial_size)
+
+        self.items = []
+        self.first_at = None
+        self.last_flush = time.perf_counter()
+
+        # EWMAs driving the target size
+        self.arrival_rate = 0.0   # packets / second
+        self.score_time = 0.0     # seconds per scored batch
+
+        self.last_reason = None
+        self.flush_reasons = {"size": 0, "deadline": 0, "eof": 0}
+
+    def _clamp(self, size):
+        return int(min(self.max_size, max(self.min_size, size)))
+
+    def extend(self, items):
+        if not items:
+            return
+        if not self.items:
+            self.first_at = time.perf_counter()
+        self.items.extend(items)
+
+    def time_left(self):
+        """Seconds until the current batch is due, or None if it's empty."""
+        if not self.items:
+            return None
+        return max(0.0, self.first_at + self.max_latency - time.perf_counter())
+
+    def due(self):
+        """Returns the flush reason ('size' / 'deadline') or None."""
+        if not self.items:
+            return None
+        if len(self.items) >= self.target:
+            return "size"
+        if time.perf_counter() - self.first_at >= self.max_latency:
+            return "deadline"
+        return None
+
+    def take(self, reason):
+        """
+        Removes and returns up to max_size items.
+        Returns: (items, fill_seconds) - how long the oldest item waited.
+        """
+        now = time.perf_counter()
+        fill = now - self.first_at if self.first_at is not None else 0.0
+        batch = self.items[:self.max_size]
+        self.items = self.items[self.max_size:]
+        self.first_at = now if self.items else None
+
+        elapsed = now - self.last_flush
+        self.last_flush = now
+        if elapsed > 0:
+            self._ewma("arrival_rate", len(batch) / elapsed)
+
+        self.last_reason = reason
+        self.flush_reasons[reason] = self.flush_reasons.get(reason, 0) + 1
+        return batch, fill
+
+    def record(self, size, score_seconds):
+        """Feeds back the scoring time of a flushed batch and retunes the target."""
+        self._ewma("score_time", score_seconds)
+        if self.arrival_rate <= 0:
+            return
+
+        # Fill the batch within whatever latency budget scoring leaves over
+        budget = max(self.max_latency - self.score_time, self.max_latency * 0.1)
+        desired = self.arrival_rate * budget
+
+        # Scoring slower than packets arrive: grow to amortize the model call
+        if size and self.score_time > size / self.arrival_rate:
+            desired = max(desired, size * 2)
+
+        self.target = self._clamp(self.target + self.smoothing * (desired - self.target))
+
+    def _ewma(self, name, value):
+        current = getattr(self, name)
+        setattr(self, name, value if current == 0 else current + self.smoothing * (value - current))
+
+    def metrics(self):
+        return {
+            "batch_size": self.target,
+            "pending": len(self.items),
+            "arrival_rate": self.arrival_rate,
+            "score_time_ms": self.score_time * 1000,
+            "last_flush_reason": self.last_reason,
+            "flush_reasons": dict(self.flush_reasons)
+        }
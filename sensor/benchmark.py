@@ -0,0 +1,270 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from detector import AnomalyDetector
+from features import parse_tshark_block
+from stats import StageTimer
+
+with open("config.json") as f:
+    data = json.load(f)
+
+MODEL_PATH = data.get("model_path", "model.npz")
+THRESHOLD = data.get("threshold", 0.10)
+BATCH_SIZE = data.get("batch_size", 10)
+SCORE_CACHE_SIZE = data.get("score_cache_size", 65536)
+SCORE_CACHE_PORT_BUCKET = data.get("score_cache_port_bucket", 1)
+SCORE_CACHE_LEN_BUCKET = data.get("score_cache_len_bucket", 1)
+ALERT_MIN_CONFIDENCE = 20 # Same alert cutoff as sensor.py
+
+THRESHOLDS = [0.0, 0.02, 0.05, 0.08, 0.10, 0.12, 0.15, 0.20]
+BATCH_SIZES = sorted({1, 10, 64, 512, 4096, BATCH_SIZE}) # Always includes the configured batch_size
+
+# --- LABELED TRAFFIC ---
+# Every generator returns (src_ips, rows) with rows = [frame_len, tcp_port, udp_port, proto, flags]
+NORMAL = "normal"
+
+def gen_normal(rng, n):
+    """Web browsing over TCP plus QUIC/DNS/NTP over UDP, like create_model.py's baseline."""
+    tcp = rng.random(n) < 2 / 3
+    rows = np.zeros((n, 5), dtype=np.int64)
+    rows[:, 0] = np.where(tcp, rng.choice([60, 1000, 1500], n, p=[0.1, 0.4, 0.5]),
+                          rng.choice([80, 1200, 1350], n, p=[0.2, 0.4, 0.4]))
+    rows[:, 1] = np.where(tcp, rng.integers(30000, 65000, n), 0)
+    rows[:, 2] = np.where(tcp, 0, rng.choice([443, 443, 53, 123], n))
+    rows[:, 3] = np.where(tcp, 6, 17)
+    rows[:, 4] = np.where(tcp, rng.choice([0x10, 0x18], n), 0)
+    ips = rng.integers(2, 250, n) + (192 << 24 | 168 << 16 | 1 << 8)
+    return ips, rows
+
+def gen_syn_flood(rng, n):
+    """Bare SYNs at one service from a spread of (spoofed) sources."""
+    rows = np.zeros((n, 5), dtype=np.int64)
+    rows[:, 0] = 60
+    rows[:, 1] = 80
+    rows[:, 3] = 6
+    rows[:, 4] = 0x02
+    ips = rng.integers(1, 1 << 16, n) + (45 << 24 | 33 << 16)
+    return ips, rows
+
+def gen_udp_flood(rng, n):
+    """Large UDP datagrams sprayed at random ports from a few sources."""
+    rows = np.zeros((n, 5), dtype=np.int64)
+    rows[:, 0] = rng.integers(1400, 1515, n)
+    rows[:, 2] = rng.integers(1, 65536, n)
+    rows[:, 3] = 17
+    ips = rng.integers(1, 8, n) + (77 << 24 | 12 << 16 | 4 << 8)
+    return ips, rows
+
+def gen_port_scan(rng, n):
+    """One source SYN-probing consecutive low ports."""
+    rows = np.zeros((n, 5), dtype=np.int64)
+    rows[:, 0] = rng.choice([58, 60, 74], n)
+    rows[:, 1] = np.arange(n) % 1024 + 1
+    rows[:, 3] = 6
+    rows[:, 4] = 0x02
+    ips = np.full(n, 6 << 24 | 6 << 16 | 6 << 8 | 6)
+    return ips, rows
+
+def gen_oversized(rng, n):
+    """Jumbo/oversized frames on otherwise ordinary-looking TCP sessions."""
+    ips, rows = gen_normal(rng, n)
+    rows[:, 0] = rng.integers(9000, 65535, n)
+    rows[:, 1] = np.where(rows[:, 3] == 6, rows[:, 1], 443)
+    rows[:, 2] = 0
+    rows[:, 3] = 6
+    rows[:, 4] = 0x18
+    ips = rng.integers(1, 4, n) + (203 << 24 | 0 << 16 | 113 << 8)
+    return ips, rows
+
+ATTACKS = {
+    "syn_flood": gen_syn_flood,
+    "udp_flood": gen_udp_flood,
+    "port_scan": gen_port_scan,
+    "oversized": gen_oversized,
+}
+KINDS = [NORMAL] + list(ATTACKS)
+
+def generate_traffic(packets=100000, attack_share=0.1, seed=7):
+    """
+    Returns (lines, labels): tshark lines in the sensor's capture format and
+    an index into KINDS per line (0 = normal). Attacks are split evenly.
+    """
+    rng = np.random.default_rng(seed)
+    per_attack = int(packets * attack_share) // len(ATTACKS)
+    parts = [(0,) + gen_normal(rng, packets - per_attack * len(ATTACKS))]
+    for k, gen in enumerate(ATTACKS.values(), 1):
+        parts.append((k,) + gen(rng, per_attack))
+
+    labels = np.concatenate([np.full(len(ips), k) for k, ips, _ in parts])
+    ips = np.concatenate([ips for _, ips, _ in parts])
+    rows = np.concatenate([rows for _, _, rows in parts])
+    order = rng.permutation(len(labels))
+    labels, ips, rows = labels[order], ips[order], rows[order]
+
+    times = 1700000000.0 + np.arange(len(labels)) * 1e-4
+    lines = []
+    for ip, (length, tport, uport, proto, flags), t in zip(ips.tolist(), rows.tolist(), times.tolist()):
+        lines.append(f"{ip >> 24}.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255},{length},"
+                     f"{tport or ''},{uport or ''},{proto},{f'0x{flags:04x}' if proto == 6 else ''},{t:.6f}\n")
+    return lines, labels
+
+# --- MEASUREMENTS ---
+def detection_quality(detector, lines, labels, thresholds):
+    """
+    Precision/recall of the sensor's alert rule (confidence > ALERT_MIN_CONFIDENCE)
+    at each decision threshold, per packet, plus recall per attack type.
+    """
+    _, features = parse_tshark_block(lines)
+    raw = np.concatenate([detector.score_array(features[i:i + 4096])[0] for i in range(0, len(features), 4096)])
+    attack = labels > 0
+
+    results = []
+    for threshold in thresholds:
+        flagged = np.clip((threshold - raw) * 2000, 0.0, 100.0) > ALERT_MIN_CONFIDENCE
+        tp = int((flagged & attack).sum())
+        fp = int((flagged & ~attack).sum())
+        fn = int((~flagged & attack).sum())
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        results.append({
+            "threshold": threshold,
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+            "false_positive_rate": fp / int((~attack).sum()) if (~attack).any() else 0.0,
+            "recall_by_attack": {
+                kind: float(flagged[labels == k].mean()) if (labels == k).any() else 0.0
+                for k, kind in enumerate(KINDS) if k
+            }
+        })
+    return results
+
+def throughput(lines, batch_sizes, min_batches=100, max_packets=20000):
+    """
+    Times parse + score only, batch by batch for each batch size, with a
+    fresh detector (cold score cache) every time. This is not
+    sensor.process_block: capture filtering, load shedding and alert
+    dispatch are left out, so it is an upper bound on sensor throughput. Each size runs on
+    max(max_packets, min_batches * size) packets at most, so batch size 1
+    doesn't dominate the run time.
+    """
+    results = []
+    all_lines = lines
+    for size in batch_sizes:
+        lines = all_lines[:max(max_packets, min_batches * size)]
+        detector = AnomalyDetector(MODEL_PATH, THRESHOLD, SCORE_CACHE_SIZE,
+                                   SCORE_CACHE_PORT_BUCKET, SCORE_CACHE_LEN_BUCKET)
+        batches = (len(lines) + size - 1) // size
+        parse_t, score_t, total_t = StageTimer(batches), StageTimer(batches), StageTimer(batches)
+        out = np.empty((size, 4), dtype=np.int64)
+        start = time.perf_counter()
+        for i in range(0, len(lines), size):
+            t0 = time.perf_counter()
+            _, features, _ = parse_tshark_block(lines[i:i + size], out, with_time=True)
+            t1 = time.perf_counter()
+            detector.score_array(features)
+            t2 = time.perf_counter()
+            parse_t.observe(t1 - t0)
+            score_t.observe(t2 - t1)
+            total_t.observe(t2 - t0)
+        elapsed = time.perf_counter() - start
+        results.append({
+            "batch_size": size,
+            "packets": len(lines),
+            "parse_score_packets_per_sec": len(lines) / elapsed if elapsed else 0.0,
+            "parse": parse_t.summary(),
+            "predict": score_t.summary(),
+            "batch": total_t.summary(),
+            "score_cache": detector.cache_metrics()
+        })
+        print(f"   batch {size:>5}: {results[-1]['parse_score_packets_per_sec']:>12,.0f} pkt/s | "
+              f"predict p50 {results[-1]['predict']['p50_ms']:.3f}ms p99 {results[-1]['predict']['p99_ms']:.3f}ms")
+    return results
+
+def compare(report, baseline, tolerance):
+    """Returns a list of regressions of `report` against an earlier report."""
+    problems = []
+    old = {r["batch_size"]: r for r in baseline.get("throughput", [])}
+    for r in report["throughput"]:
+        before = old.get(r["batch_size"])
+        if not before:
+            continue
+        pps = r["parse_score_packets_per_sec"]
+        old_pps = before.get("parse_score_packets_per_sec", before.get("packets_per_sec")) # Older reports
+        if pps < old_pps * (1 - tolerance):
+            problems.append(f"batch {r['batch_size']}: {pps:,.0f} pkt/s parse+score (was {old_pps:,.0f})")
+        if r["predict"]["p99_ms"] > before["predict"]["p99_ms"] * (1 + tolerance) + 0.05:
+            problems.append(f"batch {r['batch_size']}: predict p99 {r['predict']['p99_ms']:.3f}ms "
+                            f"(was {before['predict']['p99_ms']:.3f}ms)")
+    old_quality = {q["threshold"]: q for q in baseline.get("quality", [])}
+    for q in report["quality"]:
+        before = old_quality.get(q["threshold"])
+        if before and q["recall"] < before["recall"] - tolerance / 10:
+            problems.append(f"threshold {q['threshold']}: recall {q['recall']:.3f} (was {before['recall']:.3f})")
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detection quality and throughput benchmark on labeled synthetic traffic")
+    parser.add_argument("--packets", type=int, default=100000)
+    parser.add_argument("--attack-share", type=float, default=0.1, help="fraction of packets that are attacks")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--thresholds", default=",".join(map(str, THRESHOLDS)))
+    parser.add_argument("--batch-sizes", default=",".join(map(str, BATCH_SIZES)))
+    parser.add_argument("--out", default="benchmark.json", help="where to write the JSON results")
+    parser.add_argument("--save-traffic", metavar="FILE",
+                        help="also write the traffic as a tshark dump (replayable with sensor.py --replay) and FILE.labels")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="exit 1 if throughput/latency/recall regressed against OLD_JSON")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="allowed relative slowdown for --compare")
+    args = parser.parse_args()
+
+    print(f"🧪 Generating {args.packets:,} labeled packets ({args.attack_share:.0%} attacks)...")
+    lines, labels = generate_traffic(args.packets, args.attack_share, args.seed)
+    if args.save_traffic:
+        with open(args.save_traffic, "w") as f:
+            f.writelines(lines)
+        with open(args.save_traffic + ".labels", "w") as f:
+            f.writelines(KINDS[k] + "\n" for k in labels)
+
+    detector = AnomalyDetector(MODEL_PATH, THRESHOLD)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    print("🎯 Detection quality:")
+    quality = detection_quality(detector, lines, labels, thresholds)
+    for q in quality:
+        by_attack = " ".join(f"{k}={v:.2f}" for k, v in q["recall_by_attack"].items())
+        print(f"   threshold {q['threshold']:.2f}: precision {q['precision']:.3f} recall {q['recall']:.3f} "
+              f"fpr {q['false_positive_rate']:.4f} | {by_attack}")
+
+    print("⏱️ Throughput (parse + score only):")
+    speed = throughput(lines, [int(b) for b in args.batch_sizes.split(",")])
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "model": detector.get_model_metadata(),
+        "traffic": {
+            "packets": len(lines),
+            "seed": args.seed,
+            "by_kind": {kind: int((labels == k).sum()) for k, kind in enumerate(KINDS)}
+        },
+        "alert_min_confidence": ALERT_MIN_CONFIDENCE,
+        "quality": quality,
+        "throughput": speed
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(report, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"⚠️ Regression: {p}")
+        if problems:
+            sys.exit(1)
+        print(f"✅ No regressions against {args.compare}")
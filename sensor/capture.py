@@ -0,0 +1,494 @@
+import fcntl
+import mmap
+import os
+import select
+import socket
+import struct
+import subprocess
+import sys
+import termios
+import time
+
+import numpy as np
+
+from features import parse_tshark_block, FEATURE_COUNT
+from capture_filter import attach_filter
+
+def tshark_command(interface=None, pcap_file=None, capture_filter=None):
+    """
+    Builds the tshark command. Reads the live interface unless a pcap is given.
+    frame.time_epoch is appended last so the feature parsers ignore it.
+    capture_filter (a CaptureFilter) becomes a kernel capture filter (-f) on
+    live captures.
+    """
+    source = ["-r", pcap_file] if pcap_file else ["-i", interface]
+    expression = capture_filter.expression() if capture_filter and not pcap_file else None
+    if expression:
+        source += ["-f", expression]
+    return ["tshark"] + source + [
+        "-T", "fields",
+        "-e", "ip.src",
+        "-e", "frame.len",
+        "-e", "tcp.dstport",
+        "-e", "udp.dstport",
+        "-e", "ip.proto",
+        "-e", "tcp.flags",
+        "-e", "frame.time_epoch",
+        "-E", "separator=,",
+        "-l"
+    ]
+
+def line_timestamp(line):
+    """Returns frame.time_epoch from a tshark line, or None for old 6-field dumps."""
+    parts = line.rstrip().split(',')
+    if len(parts) < 7:
+        return None
+    try:
+        return float(parts[-1])
+    except ValueError:
+        return None
+
+class PipeReader:
+    """
+    Reads tshark lines from a pipe or file in large chunks.
+    read(timeout) returns a list of lines, [] if nothing arrived before the
+    timeout, or None at EOF. A timeout of None blocks until data arrives.
+    """
+    def __init__(self, stream, chunk_size=65536):
+        self.stream = stream  # keep the file object (and its fd) alive
+        self.fd = stream.fileno()
+        self.chunk_size = chunk_size
+        self.tail = b""
+        self.parse = parse_tshark_block
+
+    def read(self, timeout=None):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        chunk = os.read(self.fd, self.chunk_size)
+        if not chunk:
+            if self.tail:
+                last, self.tail = self.tail, b""
+                return [last.decode("ascii", "replace") + "\n"]
+            return None
+        data = self.tail + chunk
+        cut = data.rfind(b"\n") + 1
+        self.tail = data[cut:]
+        return data[:cut].decode("ascii", "replace").splitlines(keepends=True)
+
+    def backlog(self):
+        """Bytes tshark has written that we haven't read yet."""
+        try:
+            pending = struct.unpack("i", fcntl.ioctl(self.fd, termios.FIONREAD, b"\0\0\0\0"))[0]
+        except OSError:
+            pending = 0
+        return pending + len(self.tail)
+
+class PacedReader:
+    """
+    Replays items at their original capture timing.
+    timestamp(item) returns epoch seconds or None (released immediately, e.g.
+    old 6-field dumps without frame.time_epoch).
+    """
+    def __init__(self, items, timestamp=line_timestamp, parse=parse_tshark_block, max_items=4096):
+        self.items = iter(items)
+        self.timestamp = timestamp
+        self.parse = parse
+        self.max_items = max_items
+        self.pending = None
+        self.first_ts = None
+        self.start = None
+
+    def _due_at(self, item):
+        ts = self.timestamp(item)
+        if ts is None:
+            return 0.0
+        if self.first_ts is None:
+            self.first_ts = ts
+            self.start = time.time()
+        return self.start + (ts - self.first_ts)
+
+    def read(self, timeout=None):
+        out = []
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if self.pending is None:
+                item = next(self.items, None)
+                if item is None:
+                    return out or None
+                self.pending = (item, self._due_at(item))
+
+            item, due = self.pending
+            now = time.time()
+            if due <= now:
+                out.append(item)
+                self.pending = None
+                if len(out) >= self.max_items:
+                    return out
+                continue
+            if out:
+                return out
+            if deadline is not None and deadline <= now:
+                return []
+            wake = due if deadline is None else min(due, deadline)
+            time.sleep(wake - now)
+
+# --- NATIVE DECODER ---
+# Decodes the handful of header fields we use straight from raw frames with
+# struct.unpack_from on a memoryview (no slicing/copying), producing the same
+# features as parse_tshark_line without forking tshark.
+# A record is (src_ip_u32, frame_len, port, proto, flags, ts_us).
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_STATISTICS = 6
+SO_TIMESTAMPNS = getattr(socket, "SO_TIMESTAMPNS", 35) # Same value as SCM_TIMESTAMPNS
+SO_MEMINFO = 55
+_TIMESPEC = struct.Struct("@ll") # struct timespec { tv_sec, tv_nsec }
+ETH_P_IP = 0x0800
+VLAN_TYPES = (0x8100, 0x88A8)
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+
+def decode_ipv4(frame, offset, wire_len, ts_us):
+    """Decodes an IPv4 packet starting at offset. Returns a record or None."""
+    if len(frame) < offset + 20 or frame[offset] >> 4 != 4:
+        return None
+    ihl = (frame[offset] & 0x0F) * 4
+    proto = frame[offset + 9]
+    frag_offset = _U16.unpack_from(frame, offset + 6)[0] & 0x1FFF
+    src_ip = _U32.unpack_from(frame, offset + 12)[0]
+
+    port = 0
+    flags = 0
+    l4 = offset + ihl
+    # Non-first fragments carry no L4 header
+    if frag_offset == 0:
+        if proto == 6 and len(frame) >= l4 + 14:
+            port = _U16.unpack_from(frame, l4 + 2)[0]
+            flags = _U16.unpack_from(frame, l4 + 12)[0] & 0x0FFF
+        elif proto == 17 and len(frame) >= l4 + 4:
+            port = _U16.unpack_from(frame, l4 + 2)[0]
+    return (src_ip, wire_len, port, proto, flags, ts_us)
+
+def decode_ethernet(frame, wire_len, ts_us):
+    """Decodes an Ethernet frame (optionally VLAN tagged). Non-IPv4 -> None."""
+    if len(frame) < 14:
+        return None
+    offset = 12
+    ethertype = _U16.unpack_from(frame, offset)[0]
+    while ethertype in VLAN_TYPES and len(frame) >= offset + 6:
+        offset += 4
+        ethertype = _U16.unpack_from(frame, offset)[0]
+    if ethertype != ETH_P_IP:
+        return None
+    return decode_ipv4(frame, offset + 2, wire_len, ts_us)
+
+def decode_sll(frame, wire_len, ts_us):
+    """Decodes a Linux cooked capture (tshark -i any) frame."""
+    if len(frame) < 16 or _U16.unpack_from(frame, 14)[0] != ETH_P_IP:
+        return None
+    return decode_ipv4(frame, 16, wire_len, ts_us)
+
+def decode_raw(frame, wire_len, ts_us):
+    return decode_ipv4(frame, 0, wire_len, ts_us)
+
+DECODERS = {
+    LINKTYPE_ETHERNET: decode_ethernet,
+    LINKTYPE_RAW: decode_raw,
+    228: decode_raw,  # LINKTYPE_IPV4
+    LINKTYPE_LINUX_SLL: decode_sll,
+}
+
+def records_to_block(records, out=None, with_time=False):
+    """
+    Native counterpart of parse_tshark_block.
+    Returns: (src_ips, features) as int64 arrays, plus epoch timestamps
+    when with_time=True.
+    """
+    if not records:
+        empty = (np.empty(0, dtype=np.int64), np.empty((0, FEATURE_COUNT), dtype=np.int64))
+        return empty + (np.empty(0),) if with_time else empty
+    arr = np.array(records, dtype=np.int64)
+    if with_time:
+        return arr[:, 0], arr[:, 1:1 + FEATURE_COUNT], arr[:, 5] / 1e6
+    return arr[:, 0], arr[:, 1:1 + FEATURE_COUNT]
+
+def record_timestamp(record):
+    return record[5] / 1e6
+
+class PcapFileSource:
+    """
+    Reads a classic libpcap file through mmap and decodes frames in place.
+    Supports microsecond and nanosecond pcaps in either byte order.
+    """
+    def __init__(self, path, chunk_size=4096):
+        self.chunk_size = chunk_size
+        self.parse = records_to_block
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        magic = self.view[:4].tobytes()
+        formats = {
+            b"\xd4\xc3\xb2\xa1": ("<", 1), b"\xa1\xb2\xc3\xd4": (">", 1),
+            b"\x4d\x3c\xb2\xa1": ("<", 1000), b"\xa1\xb2\x3c\x4d": (">", 1000),
+        }
+        if magic not in formats:
+            raise ValueError(f"{path} is not a libpcap file (pcapng is not supported)")
+        endian, self.ts_div = formats[magic]
+        self.rec_header = struct.Struct(endian + "IIII")
+        linktype = struct.unpack_from(endian + "I", self.view, 20)[0] & 0x0FFFFFFF
+        if linktype not in DECODERS:
+            raise ValueError(f"Unsupported pcap link type {linktype}")
+        self.decode = DECODERS[linktype]
+        self.offset = 24
+
+    def records(self):
+        """Yields every decodable record in the file."""
+        view = self.view
+        size = len(view)
+        header = self.rec_header
+        decode = self.decode
+        while self.offset + 16 <= size:
+            ts_sec, ts_frac, incl_len, orig_len = header.unpack_from(view, self.offset)
+            start = self.offset + 16
+            self.offset = start + incl_len
+            record = decode(view[start:self.offset], orig_len, ts_sec * 1000000 + ts_frac // self.ts_div)
+            if record:
+                yield record
+
+    def read(self, timeout=None):
+        if not hasattr(self, "_iter"):
+            self._iter = self.records()
+        out = []
+        for record in self._iter:
+            out.append(record)
+            if len(out) >= self.chunk_size:
+                break
+        return out or None
+
+class AfPacketSource:
+    """
+    Live capture from an AF_PACKET raw socket (Linux, needs root/CAP_NET_RAW).
+    Frames are received into one preallocated buffer and decoded in place;
+    MSG_TRUNC makes recv report the full wire length like frame.len. Each
+    frame carries the kernel's receive timestamp (SO_TIMESTAMPNS), so the
+    time it waited in the socket queue shows up as lag.
+    """
+    def __init__(self, interface, snaplen=256, chunk_size=4096, capture_filter=None):
+        self.interface = interface
+        self.chunk_size = chunk_size
+        self.parse = records_to_block
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        self.filtered = False
+        if capture_filter:
+            self.set_filter(capture_filter)
+        self.sock.bind((interface, 0))
+        self.sock.setblocking(False)
+        # Like libpcap, skip our own copy of outgoing frames on loopback
+        self.skip_outgoing = interface == "lo"
+        self.buf = bytearray(snaplen)
+        self.view = memoryview(self.buf)
+        self.dropped = 0
+
+    def read(self, timeout=None):
+        ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            return []
+        out = []
+        view = self.view
+        snaplen = len(self.buf)
+        buffers = [self.buf]
+        ancbufsize = socket.CMSG_SPACE(_TIMESPEC.size)
+        while len(out) < self.chunk_size:
+            try:
+                wire_len, ancdata, _, address = self.sock.recvmsg_into(buffers, ancbufsize, socket.MSG_TRUNC)
+            except BlockingIOError:
+                break
+            if self.skip_outgoing and address[2] == socket.PACKET_OUTGOING:
+                continue
+            ts_us = None
+            for level, kind, data in ancdata:
+                if level == socket.SOL_SOCKET and kind == SO_TIMESTAMPNS and len(data) >= _TIMESPEC.size:
+                    sec, nsec = _TIMESPEC.unpack_from(data)
+                    ts_us = sec * 1000000 + nsec // 1000
+            if ts_us is None:
+                ts_us = int(time.time() * 1000000)
+            record = decode_ethernet(view[:min(wire_len, snaplen)], wire_len, ts_us)
+            if record:
+                out.append(record)
+        return out
+
+    def backlog(self):
+        """
+        Bytes waiting in the socket's receive queue. FIONREAD on a packet
+        socket only reports the next frame, so this reads the queue's memory
+        use (SO_MEMINFO rmem_alloc) and falls back to FIONREAD.
+        """
+        try:
+            return struct.unpack_from("I", self.sock.getsockopt(socket.SOL_SOCKET, SO_MEMINFO, 36))[0]
+        except OSError:
+            pass
+        try:
+            return struct.unpack("i", fcntl.ioctl(self.sock.fileno(), termios.FIONREAD, b"\0\0\0\0"))[0]
+        except OSError:
+            return 0
+
+    def set_filter(self, capture_filter):
+        """
+        Drops excluded traffic in the kernel (replacing any previous filter).
+        Returns False if the rules can't be compiled or attached; the parser
+        side of the filter still applies then.
+        """
+        try:
+            attach_filter(self.sock, capture_filter.program())
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Kernel capture filter not attached ({e}), filtering in the sensor")
+            self.filtered = False
+            return False
+        self.filtered = bool(capture_filter)
+        return True
+
+    def drops(self):
+        """Frames the kernel dropped because we didn't read fast enough (cumulative)."""
+        # struct tpacket_stats { unsigned int tp_packets, tp_drops; }, reset on every read
+        raw = self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 8)
+        self.dropped += struct.unpack("II", raw)[1]
+        return self.dropped
+
+def write_pcap(path, frames, linktype=LINKTYPE_ETHERNET):
+    """
+    Writes frames to a microsecond libpcap file.
+    frames: iterable of (timestamp, bytes) or (timestamp, bytes, wire_len).
+    """
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, linktype))
+        for frame in frames:
+            ts, data = frame[0], frame[1]
+            wire_len = frame[2] if len(frame) > 2 else len(data)
+            sec = int(ts)
+            f.write(struct.pack("<IIII", sec, int(round((ts - sec) * 1000000)), len(data), wire_len))
+            f.write(data)
+
+def build_frame(src_ip, dst_ip, proto, dport=0, flags=0, length=60, vlan=None, sport=40000):
+    """
+    Builds an Ethernet/IPv4 frame (TCP, UDP or bare IP payload) padded to length.
+    Used for sample pcaps and synthetic benchmark traffic.
+    """
+    if proto == 6:
+        l4 = struct.pack("!HHIIHHHH", sport, dport, 0, 0, (5 << 12) | (flags & 0x0FFF), 64240, 0, 0)
+    elif proto == 17:
+        l4 = struct.pack("!HHHH", sport, dport, 8, 0)
+    else:
+        l4 = b""
+    header_len = 14 + (4 if vlan is not None else 0) + 20
+    payload = b"\x00" * max(0, length - header_len - len(l4))
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4) + len(payload), 0, 0x4000, 64, proto, 0,
+                     socket.inet_aton(src_ip), socket.inet_aton(dst_ip))
+    eth = b"\x02\x00\x00\x00\x00\x02" + b"\x02\x00\x00\x00\x00\x01"
+    if vlan is not None:
+        eth += struct.pack("!HH", 0x8100, vlan)
+    eth += _U16.pack(ETH_P_IP)
+    return eth + ip + l4 + payload
+
+def open_capture(interface, replay_file=None, realtime=False, backend="tshark", capture_filter=None):
+    """
+    Returns (process, reader). process is the tshark subprocess, if any.
+    .csv/.txt files are read as saved tshark output, anything else as a pcap.
+    backend "native" decodes frames in-process (AF_PACKET socket or pcap
+    file) and falls back to tshark if that isn't possible here.
+    capture_filter (a CaptureFilter) is pushed into the kernel on live captures.
+    """
+    if replay_file and replay_file.endswith((".csv", ".txt")):
+        print(f"📼 Replaying tshark dump {replay_file}...")
+        stream = open(replay_file)
+        if realtime:
+            return None, PacedReader(stream)
+        return None, PipeReader(stream)
+
+    if backend == "native":
+        try:
+            if replay_file:
+                source = PcapFileSource(replay_file)
+                print(f"📼 Replaying pcap {replay_file} (native decoder)...")
+                if realtime:
+                    return None, PacedReader(source.records(), timestamp=record_timestamp, parse=records_to_block)
+                return None, source
+            source = AfPacketSource(interface, capture_filter=capture_filter)
+            print(f"👀 Sensor Active on {interface} (native decoder)...")
+            return None, source
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Native capture unavailable ({e}), falling back to tshark")
+
+    process = subprocess.Popen(tshark_command(interface, replay_file, capture_filter),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if replay_file:
+        print(f"📼 Replaying pcap {replay_file}...")
+    else:
+        print(f"👀 Sensor Active on {interface}...")
+    if replay_file and realtime:
+        return process, PacedReader(process.stdout)
+    return process, PipeReader(process.stdout)
+
+# --- EQUIVALENCE CHECK ---
+def make_sample_pcap(path):
+    """Writes a small pcap covering TCP/UDP/ICMP, VLAN tags, fragments and non-IP frames."""
+    ts = 1700000000.0
+    frames = []
+    def add(data, wire_len=None):
+        nonlocal ts
+        ts += 0.001
+        frames.append((ts, data, wire_len or len(data)))
+    add(build_frame("192.168.1.20", "10.0.0.50", 6, 443, 0x018, 1500))
+    add(build_frame("192.168.1.20", "10.0.0.50", 6, 80, 0x002, 60))
+    add(build_frame("6.6.6.6", "10.0.0.50", 6, 22, 0x002, 60, vlan=10))
+    add(build_frame("6.6.6.6", "10.0.0.50", 6, 8080, 0x0C2, 74))
+    add(build_frame("10.0.0.9", "8.8.8.8", 17, 53, 0, 80))
+    add(build_frame("10.0.0.9", "10.0.0.50", 17, 443, 0, 1350))
+    add(build_frame("10.0.0.9", "10.0.0.50", 1, length=98))
+    frag = bytearray(build_frame("5.5.5.5", "10.0.0.50", 17, 9999, 0, 600))
+    frag[20:22] = _U16.pack(0x0020)  # non-first fragment
+    add(bytes(frag))
+    add(b"\xff" * 6 + b"\x02\x00\x00\x00\x00\x09" + b"\x08\x06" + b"\x00" * 46)  # ARP
+    big = build_frame("7.7.7.7", "10.0.0.50", 6, 3389, 0x010, 128)
+    add(big, 9000)  # truncated capture of a jumbo frame
+    write_pcap(path, frames)
+
+def compare_backends(pcap_path):
+    """
+    Decodes pcap_path with tshark and with the native decoder and reports
+    every record where [src_ip, frame_len, port, proto, flags] differ.
+    Returns the number of mismatches.
+    """
+    tshark = subprocess.run(tshark_command(pcap_file=pcap_path), capture_output=True, text=True, check=True)
+    lines = tshark.stdout.splitlines(keepends=True)
+    t_ips, t_feats = parse_tshark_block(lines) if lines else records_to_block([])
+    n_ips, n_feats = records_to_block(list(PcapFileSource(pcap_path).records()))
+
+    mismatches = 0
+    if len(t_ips) != len(n_ips):
+        print(f"❌ Record count differs: tshark={len(t_ips)} native={len(n_ips)}")
+        return max(len(t_ips), len(n_ips))
+    for i in range(len(t_ips)):
+        a = [int(t_ips[i])] + t_feats[i].tolist()
+        b = [int(n_ips[i])] + n_feats[i].tolist()
+        if a != b:
+            mismatches += 1
+            print(f"❌ #{i}: tshark={a} native={b}")
+    print(f"{'✅' if not mismatches else '❌'} {len(t_ips)} records compared, {mismatches} mismatches")
+    return mismatches
+
+if __name__ == "__main__":
+    # python capture.py --compare [file.pcap]   (defaults to a generated sample)
+    if len(sys.argv) >= 2 and sys.argv[1] == "--compare":
+        path = sys.argv[2] if len(sys.argv) > 2 else "sample.pcap"
+        if len(sys.argv) <= 2:
+            make_sample_pcap(path)
+            print(f"🧪 Wrote sample capture to {path}")
+        sys.exit(1 if compare_backends(path) else 0)
+    print("Usage: python capture.py --compare [file.pcap]")
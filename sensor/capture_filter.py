@@ -0,0 +1,118 @@
+import ctypes
+import ipaddress
+import socket
+import struct
+
+import numpy as np
+
+from features import ips_to_u32
+
+SO_ATTACH_FILTER = 26
+SNAPLEN = 262144  # "accept the whole frame" return value
+
+# Classic BPF opcodes (linux/filter.h)
+LD_W_ABS = 0x20
+LD_H_ABS = 0x28
+LD_B_ABS = 0x30
+LD_H_IND = 0x48
+LDX_B_MSH = 0xb1
+ALU_AND_K = 0x54
+JMP_JEQ_K = 0x15
+JMP_JSET_K = 0x45
+RET_K = 0x06
+
+MAX_JUMP = 255  # Jump offsets are 8 bits
+
+class CaptureFilter:
+    """
+    Traffic the sensor never scores, dropped before it reaches Python:
+    whitelisted source hosts, trusted source subnets and trusted
+    destination ports (TCP/UDP).
+
+    The same rules come out three ways: a pcap expression for `tshark -f`,
+    a classic BPF program for the AF_PACKET socket, and drop_mask() for
+    whatever still reaches the parser (replays, or a kernel that refused
+    the filter).
+    """
+    def __init__(self, hosts=(), nets=(), ports=()):
+        self.hosts = ips_to_u32(hosts)
+        networks = []
+        for net in nets:
+            try:
+                network = ipaddress.ip_network(net, strict=False)
+            except ValueError:
+                print(f"⚠️ Ignoring invalid capture exclusion subnet: {net}")
+                continue
+            if network.version == 4:
+                networks.append((int(network.network_address), int(network.netmask)))
+        self.nets = np.array(networks, dtype=np.int64).reshape(-1, 2)
+        self.ports = np.array(sorted({int(p) for p in ports if 0 < int(p) < 65536}), dtype=np.int64)
+
+    def __eq__(self, other):
+        return (isinstance(other, CaptureFilter) and np.array_equal(self.hosts, other.hosts)
+                and np.array_equal(self.nets, other.nets) and np.array_equal(self.ports, other.ports))
+
+    def __bool__(self):
+        return bool(len(self.hosts) or len(self.nets) or len(self.ports))
+
+    def drop_mask(self, src_ips, features):
+        """True for rows the filter excludes. features: (n, 4) [frame_len, port, proto, flags]"""
+        drop = np.isin(src_ips, self.hosts)
+        for net, mask in self.nets:
+            drop |= (src_ips & mask) == net
+        if len(self.ports):
+            l4 = (features[:, 2] == 6) | (features[:, 2] == 17)
+            drop |= l4 & np.isin(features[:, 1], self.ports)
+        return drop
+
+    def expression(self):
+        """pcap filter expression for tshark -f, or None if there is nothing to exclude."""
+        terms = [f"src host {socket.inet_ntoa(struct.pack('!I', int(h)))}" for h in self.hosts]
+        terms += [f"src net {ipaddress.ip_network((int(n), bin(int(m)).count('1')))}" for n, m in self.nets]
+        terms += [f"dst port {int(p)}" for p in self.ports]
+        return f"not ({' or '.join(terms)})" if terms else None
+
+    def program(self):
+        """
+        Classic BPF program for Ethernet frames as a list of (code, jt, jf, k).
+        Only untagged IPv4 is checked; anything else (VLAN tags, non-IP) is
+        passed up for the decoder to handle, as without a filter.
+        Raises ValueError if the rules don't fit in 8-bit jump offsets.
+        """
+        ops = [(LD_H_ABS, 0, 0, 12),
+               (JMP_JEQ_K, 0, "accept", 0x0800),
+               (LD_W_ABS, 0, 0, 26)]  # IPv4 source address
+        for host in self.hosts:
+            ops.append((JMP_JEQ_K, "reject", 0, int(host)))
+        for net, mask in self.nets:
+            ops += [(LD_W_ABS, 0, 0, 26),
+                    (ALU_AND_K, 0, 0, int(mask)),
+                    (JMP_JEQ_K, "reject", 0, int(net))]
+        if len(self.ports):
+            ops += [(LD_B_ABS, 0, 0, 23),           # protocol
+                    (JMP_JEQ_K, 1, 0, 6),
+                    (JMP_JEQ_K, 0, "accept", 17),
+                    (LD_H_ABS, 0, 0, 20),           # later fragments carry no ports
+                    (JMP_JSET_K, "accept", 0, 0x1fff),
+                    (LDX_B_MSH, 0, 0, 14),          # X = IP header length
+                    (LD_H_IND, 0, 0, 16)]           # destination port
+            for port in self.ports:
+                ops.append((JMP_JEQ_K, "reject", 0, int(port)))
+        labels = {"accept": len(ops), "reject": len(ops) + 1}
+        ops += [(RET_K, 0, 0, SNAPLEN), (RET_K, 0, 0, 0)]
+
+        program = []
+        for i, (code, jt, jf, k) in enumerate(ops):
+            jt = labels[jt] - i - 1 if isinstance(jt, str) else jt
+            jf = labels[jf] - i - 1 if isinstance(jf, str) else jf
+            if jt > MAX_JUMP or jf > MAX_JUMP:
+                raise ValueError(f"{len(self.hosts) + len(self.nets) + len(self.ports)} rules is too many for a classic BPF filter")
+            program.append((code, jt, jf, k))
+        return program
+
+def attach_filter(sock, program):
+    """Attaches (or atomically replaces) a classic BPF program on a socket."""
+    insns = b"".join(struct.pack("HBBI", *op) for op in program)
+    buf = ctypes.create_string_buffer(insns)
+    fprog = struct.pack("HP", len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
@@ -2,6 +2,35 @@ import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
 import joblib
+from forest import export_model
+import sys
+
+if "--flow" in sys.argv:
+    # --- FLOW MODEL (per source IP, per window) ---
+    from flows import FLOW_FEATURES
+    print("🧪 Generating synthetic per-IP flow windows...")
+
+    n = 5000
+    pkt_rate = np.random.lognormal(1.0, 1.0, n)                  # packets/s, mostly light hosts
+    mean_len = np.random.choice([120, 600, 1100, 1400], n, p=[0.2, 0.3, 0.3, 0.2]) * np.random.uniform(0.8, 1.2, n)
+    udp_share = np.random.choice([0.0, 0.1, 0.5, 1.0], n, p=[0.4, 0.3, 0.2, 0.1])
+    flow_data = {
+        'pkt_rate': pkt_rate,
+        'byte_rate': pkt_rate * mean_len,
+        'distinct_ports': np.random.randint(1, 6, n),           # a handful of services per window
+        'syn_ack_ratio': np.random.uniform(0.0, 0.2, n),        # handshakes are a small share of ACKs
+        'udp_share': udp_share,
+        'mean_len': mean_len
+    }
+    df = pd.DataFrame(flow_data, columns=FLOW_FEATURES)
+
+    print(f"📊 Training on {len(df)} flow windows...")
+    clf = IsolationForest(n_estimators=100, contamination=0.005, random_state=42)
+    clf.fit(df)
+    joblib.dump(clf, "flow_model.pkl")
+    export_model("flow_model.pkl", "flow_model.npz", samples=df.to_numpy())
+    print("✅ Flow Model saved as 'flow_model.pkl' (+ 'flow_model.npz' for the sensor)")
+    sys.exit(0)
 
 print("🧪 Generating synthetic 'Pro' dataset (TCP + UDP)...")
 
@@ -39,4 +68,5 @@ clf = IsolationForest(n_estimators=100, contamination=0.005, random_state=42)
 clf.fit(df)
 
 joblib.dump(clf, "model.pkl")
-print("✅ Pro Model saved as 'model.pkl'")
+export_model("model.pkl", "model.npz", samples=df.to_numpy())
+print("✅ Pro Model saved as 'model.pkl' (+ 'model.npz' for the sensor)")
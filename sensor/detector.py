@@ -1,15 +1,56 @@
-import joblib
-import pandas as pd
+import numpy as np
 import os
 import datetime
+import hashlib
+import threading
+import time
+from flows import FLOW_FEATURES, FLOW_FEATURE_COUNT
+from score_cache import ScoreCache
+from forest import FlatForest
+
+# Rows every candidate model must score before it's swapped in
+WARM_PACKETS = np.array([
+    [60, 443, 6, 0x10], [1500, 443, 6, 0x18], [74, 22, 6, 0x02],
+    [80, 53, 17, 0], [1350, 443, 17, 0], [98, 0, 1, 0]
+], dtype=np.int64)
+
+def load_model(model_path):
+    """
+    Loads a model file. Returns (model, sha256 of the file).
+    """
+    with open(model_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    if model_path.endswith(".npz"):
+        # Flat export (forest.py): plain NumPy, no sklearn/pandas at runtime
+        model = FlatForest.load(model_path)
+    else:
+        import joblib
+        model = joblib.load(model_path)
+        # We score raw ndarrays, not DataFrames. Drop the fitted column names so
+        # sklearn doesn't warn about missing feature names on every batch.
+        if hasattr(model, "feature_names_in_"):
+            del model.feature_names_in_
+    return model, digest
 
 class AnomalyDetector:
-    def __init__(self, model_path="model.pkl", threshold=0.10):
+    def __init__(self, model_path="model.pkl", threshold=0.10, cache_size=0, port_bucket=1, len_bucket=1):
         print(f"🧠 Loading Model from {model_path} (Threshold: {threshold})...")
-        self.model = joblib.load(model_path)
+        self.model, self.model_sha256 = load_model(model_path)
         self.model_path = model_path
-        self.feature_cols = ['frame.len', 'port', 'ip.proto', 'tcp.flags']
+        self.version = 1 # Bumped on every successful reload
+        self.loaded_at = time.time()
+        self.reloads_failed = 0
+        # Packet models score [frame_len, port, proto, flags]; flow models
+        # score the per-IP window features from flows.FlowTable
+        if getattr(self.model, "n_features_in_", 4) == FLOW_FEATURE_COUNT:
+            self.feature_cols = FLOW_FEATURES
+        else:
+            self.feature_cols = ['frame.len', 'port', 'ip.proto', 'tcp.flags']
         self.threshold = threshold
+        # Packet scores are memoized per feature tuple (flow features are continuous)
+        self.cache = None
+        if cache_size and self.feature_cols is not FLOW_FEATURES:
+            self.cache = ScoreCache(cache_size, port_bucket, len_bucket)
 
     def normalize_score(self, anomaly_score):
         """
@@ -36,23 +77,123 @@ class AnomalyDetector:
             date_str = "Unknown"
 
         return {
-            "version" : "1.0",
+            "version" : f"1.{self.version - 1}",
+            "sha256" : self.model_sha256,
             "last_trained" : date_str,
+            "loaded_at" : datetime.datetime.fromtimestamp(self.loaded_at).strftime('%Y-%m-%d %H:%M:%S'),
+            "reloads_failed" : self.reloads_failed,
             "threshold" : self.threshold
         }
 
+    def reload(self):
+        """
+        Loads model_path again and swaps it in. Returns True if a new model
+        was swapped in, False if the file is unchanged or the model was
+        refused (load error, wrong feature count, invalid warm-up scores).
+        """
+        try:
+            model, digest = load_model(self.model_path)
+            if digest == self.model_sha256:
+                return False
+            n_features = getattr(model, "n_features_in_", None)
+            if n_features != len(self.feature_cols):
+                raise ValueError(f"expects {n_features} features, this sensor scores {len(self.feature_cols)}")
+
+            # Pre-warm (first-call allocations, lazy imports) and sanity check
+            warm = WARM_PACKETS if self.feature_cols is not FLOW_FEATURES else np.ones((4, FLOW_FEATURE_COUNT))
+            scores = np.asarray(model.decision_function(warm), dtype=np.float64)
+            if scores.shape != (len(warm),) or not np.isfinite(scores).all():
+                raise ValueError("warm-up batch produced invalid scores")
+        except Exception as e:
+            self.reloads_failed += 1
+            print(f"⚠️ Model reload rejected ({self.model_path}): {e}")
+            return False
+
+        self.model = model  # The score cache notices the new object and clears itself
+        self.model_sha256 = digest
+        self.version += 1
+        self.loaded_at = time.time()
+        print(f"🔄 Model reloaded: {self.model_path} v1.{self.version - 1} (sha256 {digest[:12]})")
+        return True
+
+    def normalize_scores(self, raw_scores):
+        """
+        Vectorized normalize_score: a single clip over the whole batch.
+        """
+        return np.clip((self.threshold - raw_scores) * 2000, 0.0, 100.0)
+
+    def score_array(self, X):
+        """
+        X: (n, 4) ndarray of [frame_len, port, proto, flags]
+           (or (n, 6) flow features for a flow model)
+        Returns: (raw_scores, confidences) as ndarrays
+        """
+        if len(X) == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty
+        model = self.model # One model per batch, even if a reload swaps mid-call
+        if self.cache is not None:
+            raw_scores = self.cache.score(model, X)
+        else:
+            raw_scores = model.decision_function(X)
+        return raw_scores, self.normalize_scores(raw_scores)
+
+    def cache_metrics(self):
+        return self.cache.metrics() if self.cache is not None else None
+
     def predict_batch(self, batch_features):
         """
         batch_features: List of lists [frame_len, port, proto, flags]
         Returns: List of (raw_score, normalized_confidence)
         """
-        if not batch_features:
+        if not len(batch_features):
             return []
 
-        df = pd.DataFrame(batch_features, columns=self.feature_cols)
-        raw_scores = self.model.decision_function(df)
-        
-        results = []
-        for score in raw_scores:
-            results.append((score, self.normalize_score(score)))
-        return results
+        raw_scores, confidences = self.score_array(np.asarray(batch_features, dtype=np.int64))
+        return list(zip(raw_scores.tolist(), confidences.tolist()))
+
+
+class ModelWatcher:
+    """
+    Background thread that reloads the detector when model_path changes on
+    disk (mtime/size, checked every `interval` seconds) or when trigger()
+    is called (SIGHUP). An interval of 0 only reloads on trigger().
+
+    Loading and warming happen on this thread; scoring only sees the swap.
+    """
+    def __init__(self, detector, interval=5.0):
+        self.detector = detector
+        self.interval = interval
+        self.wake = threading.Event()
+        self.last_stat = self._stat()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _stat(self):
+        try:
+            st = os.stat(self.detector.model_path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def trigger(self):
+        """Forces a reload check now (safe to call from a signal handler)."""
+        self.wake.set()
+
+    def _run(self):
+        while True:
+            forced = self.wake.wait(self.interval or None)
+            self.wake.clear()
+            current = self._stat()
+            if current is None:
+                continue # Mid-copy or removed; keep the current model
+            if forced or current != self.last_stat:
+                # Let a writer that is still copying the file finish first
+                time.sleep(0.2)
+                if self._stat() != current:
+                    continue
+                self.last_stat = current
+                self.detector.reload()
@@ -1,3 +1,7 @@
+import socket
+import struct
+import numpy as np
+
 def parse_tshark_line(line):
     """
     Parses a single line of tshark CSV output.
@@ -33,3 +37,206 @@ def parse_tshark_line(line):
         return src_ip, features
     except Exception:
         return None, None
+
+
+
+# --- BLOCK PARSING (columnar fast path) ---
+# Works on the raw bytes of a whole block of lines: separators are located
+# once with NumPy and every column is decoded with array arithmetic, so no
+# per-packet Python objects are created. Source IPs come back as IPv4
+# uint32 values; use u32_to_ip() to turn the few that alert back into text.
+FEATURE_COUNT = 4  # [frame_len, port, proto, flags]
+
+# Byte -> digit value ('0'-'9', 'a'-'f', 'A'-'F'), 99 for anything else
+_DIGITS = np.full(256, 99, dtype=np.int64)
+_DIGITS[48:58] = np.arange(10)
+_DIGITS[97:103] = np.arange(10, 16)
+_DIGITS[65:71] = np.arange(10, 16)
+
+_INT64_MAX = 2**63 - 1
+
+def _to_int(v):
+    """Same tolerant conversion as parse_tshark_line (hex or decimal, 0 on junk), kept inside int64."""
+    try:
+        if not v: return 0
+        value = int(v, 0)
+        return value if abs(value) <= _INT64_MAX else 0
+    except:
+        return 0
+
+def ip_to_u32(ip):
+    """'10.0.0.5' -> 167772165, or -1 if it is not an IPv4 address."""
+    try:
+        return struct.unpack("!I", socket.inet_aton(ip))[0]
+    except (OSError, TypeError):
+        return -1
+
+def u32_to_ip(value):
+    return socket.inet_ntoa(struct.pack("!I", int(value)))
+
+def ips_to_u32(ips):
+    """Converts a list of IP strings (e.g. the whitelist), skipping invalid ones."""
+    values = [ip_to_u32(ip) for ip in ips]
+    return np.array([v for v in values if v >= 0], dtype=np.int64)
+
+def _parse_int_fields(buf, starts, ends):
+    """
+    Decodes one column of decimal or 0x-hex fields, like int(v, 0).
+    Empty or malformed fields become 0, as in parse_tshark_line.
+    """
+    lens = ends - starts
+    width = max(int(lens.max()), 1)
+    if width > 18:  # would overflow int64, can't be a real header field
+        return np.array([_to_int(bytes(buf[a:b]).decode("ascii", "replace")) for a, b in zip(starts, ends)],
+                        dtype=np.int64)
+    pos = np.arange(width)
+    inside = pos < lens[:, None]
+    chars = buf[np.minimum(starts[:, None] + pos, len(buf) - 1)]
+    digits = _DIGITS[chars]
+
+    is_hex = (lens > 2) & (chars[:, 0] == 48) & ((chars[:, min(1, width - 1)] | 0x20) == 120)
+    base = np.where(is_hex, 16, 10)
+    used = inside & ~(is_hex[:, None] & (pos < 2))  # skip the '0x' prefix
+
+    ok = ~(used & (digits >= base[:, None])).any(axis=1)
+    # int(v, 0) rejects leading zeros on decimals ("06")
+    ok &= is_hex | (lens <= 1) | (chars[:, 0] != 48)
+
+    exp = np.where(used, lens[:, None] - 1 - pos, 0)
+    values = np.where(used, digits * base[:, None] ** exp, 0).sum(axis=1)
+    return np.where(ok, values, 0)
+
+def _parse_ip_fields(buf, starts, ends):
+    """
+    Decodes one column of ip.src fields to uint32 (-1 if invalid).
+    Only the distinct addresses go through Python.
+    """
+    lens = ends - starts
+    width = max(int(lens.max()), 1)
+    pos = np.arange(width)
+    idx = starts[:, None] + pos
+    chars = buf[np.minimum(idx, len(buf) - 1)]
+    chars[pos >= lens[:, None]] = 0
+    keys = np.ascontiguousarray(chars).view(f"S{width}").ravel()
+
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    lookup = np.fromiter(
+        (ip_to_u32(u.decode("ascii", "replace").strip().replace('\\', '').replace('"', '')) for u in uniq),
+        dtype=np.int64, count=len(uniq))
+    return lookup[inverse.reshape(-1)]
+
+def _parse_epoch_fields(buf, starts, ends):
+    """
+    Decodes one column of frame.time_epoch fields ("1700000000.123456789")
+    to float seconds. Empty or malformed fields become NaN.
+    """
+    lens = ends - starts
+    width = max(int(lens.max()), 1)
+    pos = np.arange(width)
+    inside = pos < lens[:, None]
+    chars = buf[np.minimum(starts[:, None] + pos, len(buf) - 1)]
+    is_dot = inside & (chars == 46)
+    digits = _DIGITS[chars]
+    is_digit = inside & (digits < 10)
+
+    # Drop digits beyond the 18th so the combined integer stays inside int64
+    digit_rank = np.cumsum(is_digit, axis=1)
+    used = is_digit & (digit_rank <= 18)
+    ok = (lens > 0) & ((is_digit | is_dot) == inside).all(axis=1) & (is_dot.sum(axis=1) <= 1)
+
+    exp = np.where(used, used.sum(axis=1)[:, None] - digit_rank, 0)
+    values = np.where(used, digits * 10 ** exp, 0).sum(axis=1)
+    # Digits after the dot (that we kept) scale the integer back down
+    after_dot = np.cumsum(is_dot, axis=1) > 0
+    frac_digits = (used & after_dot).sum(axis=1)
+    return np.where(ok, values / 10.0 ** frac_digits, np.nan)
+
+def _field_bounds(buf, n):
+    """
+    Returns (starts, ends) as (n, width) arrays if every line in the block has
+    the same number of fields, else None (e.g. aggregated ICMP error fields).
+    """
+    seps = np.flatnonzero((buf == 44) | (buf == 10))
+    if len(seps) % n:
+        return None
+    seps = seps.reshape(n, -1)
+    if seps.shape[1] < 6 or not (buf[seps[:, -1]] == 10).all():
+        return None
+    if (buf[seps[:, :-1]] == 10).any():
+        return None
+    starts = np.empty_like(seps)
+    starts[0, 0] = 0
+    starts[1:, 0] = seps[:-1, -1] + 1
+    starts[:, 1:] = seps[:, :-1] + 1
+    return starts, seps
+
+def _line_time(line):
+    parts = line.rstrip().split(',')
+    try:
+        return float(parts[-1]) if len(parts) >= 7 else np.nan
+    except ValueError:
+        return np.nan
+
+def _parse_block_slow(lines):
+    """Per-line fallback for blocks the fast path can't align."""
+    ips, rows, times = [], [], []
+    for line in lines:
+        src_ip, features = parse_tshark_line(line)
+        if features:
+            ips.append(ip_to_u32(src_ip))
+            rows.append([v if abs(v) <= _INT64_MAX else 0 for v in features])
+            times.append(_line_time(line))
+    return (np.array(ips, dtype=np.int64),
+            np.array(rows, dtype=np.int64).reshape(-1, FEATURE_COUNT),
+            np.array(times, dtype=np.float64))
+
+def parse_tshark_block(lines, out=None, with_time=False):
+    """
+    Parses a block of tshark lines straight into an int64 feature array.
+    out: optional preallocated (>= n, 4) int64 array reused between batches.
+    Returns: (src_ips, features) - uint32 source IPs as int64 and an (m, 4)
+    array [frame_len, port, proto, flags]. Lines without a valid IPv4
+    ip.src are dropped.
+    with_time=True also returns frame.time_epoch per row (NaN when the dump
+    has no timestamp column): (src_ips, features, timestamps).
+    """
+    n = len(lines)
+    if n == 0:
+        empty = (np.empty(0, dtype=np.int64), np.empty((0, FEATURE_COUNT), dtype=np.int64))
+        return empty + (np.empty(0),) if with_time else empty
+
+    text = "".join(lines)
+    if not text.endswith("\n"):
+        text += "\n"
+    if "\r" in text:
+        text = text.replace("\r", "")
+    buf = np.frombuffer(text.encode("ascii", "replace"), dtype=np.uint8)
+
+    bounds = _field_bounds(buf, n)
+    if bounds is None:
+        src_ips, features, times = _parse_block_slow(lines)
+    else:
+        starts, ends = bounds
+        if out is None or out.shape[0] < n:
+            out = np.empty((n, FEATURE_COUNT), dtype=np.int64)
+        features = out[:n]
+        src_ips = _parse_ip_fields(buf, starts[:, 0], ends[:, 0])
+        features[:, 0] = _parse_int_fields(buf, starts[:, 1], ends[:, 1])
+        # Smart Port Logic: Summing TCP and UDP ports as one will always be 0
+        features[:, 1] = _parse_int_fields(buf, starts[:, 2], ends[:, 2])
+        features[:, 1] += _parse_int_fields(buf, starts[:, 3], ends[:, 3])
+        features[:, 2] = _parse_int_fields(buf, starts[:, 4], ends[:, 4])
+        features[:, 3] = _parse_int_fields(buf, starts[:, 5], ends[:, 5])
+        if not with_time:
+            times = None
+        elif starts.shape[1] >= 7:
+            times = _parse_epoch_fields(buf, starts[:, -1], ends[:, -1])
+        else:
+            times = np.full(n, np.nan)
+
+    valid = src_ips >= 0
+    if not valid.all():
+        src_ips, features = src_ips[valid], features[valid]
+        if with_time:
+            times = times[valid]
+    return (src_ips, features, times) if with_time else (src_ips, features)
@@ -0,0 +1,226 @@
+import numpy as np
+
+# Per-source-IP window features fed to the flow model (see train.py / create_model.py)
+FLOW_FEATURES = ['pkt_rate', 'byte_rate', 'distinct_ports', 'syn_ack_ratio', 'udp_share', 'mean_len']
+FLOW_FEATURE_COUNT = len(FLOW_FEATURES)
+
+# Distinct destination ports are estimated by linear counting on a small bitmap
+PORT_BITS = 1024
+_WORDS = PORT_BITS // 64
+
+# Columns of FlowTable.counts
+_PACKETS, _BYTES, _SYN, _ACK, _UDP = range(5)
+
+def window_features(counts, ports, window):
+    """
+    Turns raw window aggregates into model features.
+    counts: (m, 5) [packets, bytes, syn, ack, udp], ports: (m, _WORDS) bitmaps
+    Returns: (m, 6) float64 array in FLOW_FEATURES order.
+    """
+    packets = np.maximum(counts[:, _PACKETS], 1).astype(np.float64)
+    set_bits = np.unpackbits(np.ascontiguousarray(ports).view(np.uint8), axis=1).sum(axis=1)
+    zeros = np.maximum(PORT_BITS - set_bits, 1)
+    distinct = np.where(set_bits > 0, -PORT_BITS * np.log(zeros / PORT_BITS), 0.0)
+
+    X = np.empty((len(counts), FLOW_FEATURE_COUNT), dtype=np.float64)
+    X[:, 0] = counts[:, _PACKETS] / window
+    X[:, 1] = counts[:, _BYTES] / window
+    X[:, 2] = distinct
+    X[:, 3] = counts[:, _SYN] / np.maximum(counts[:, _ACK], 1)
+    X[:, 4] = counts[:, _UDP] / packets
+    X[:, 5] = counts[:, _BYTES] / packets
+    return X
+
+class FlowTable:
+    """
+    Per-source-IP aggregates over tumbling windows of `window` seconds,
+    keyed by packet time so live capture, replays and training agree.
+
+    State lives in preallocated arrays of `capacity` slots (bounded memory).
+    When full, the least recently seen IPs are evicted (their partial window
+    is emitted first); slots idle for idle_timeout seconds are freed.
+
+    update() returns one record per (source IP, closed window) to score
+    instead of one per packet. Packets arriving after their window was
+    emitted are dropped and counted in late_packets, so a window is never
+    scored twice.
+    """
+    def __init__(self, window=5.0, capacity=65536, idle_timeout=60.0):
+        self.window = float(window)
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+
+        self.slot_of = {}
+        self.ip = np.full(capacity, -1, dtype=np.int64)
+        self.wid = np.zeros(capacity, dtype=np.int64)
+        self.last_seen = np.zeros(capacity, dtype=np.float64)
+        self.counts = np.zeros((capacity, 5), dtype=np.int64)
+        self.ports = np.zeros((capacity, _WORDS), dtype=np.uint64)
+        self.free = list(range(capacity - 1, -1, -1))
+
+        self.clock = 0.0
+        self.evictions = 0
+        self.dropped = 0
+        self.late_packets = 0
+        self._emitted = []
+
+    def __len__(self):
+        return len(self.slot_of)
+
+    # --- Emission ---
+    def _emit(self, ips, counts, ports):
+        if len(ips):
+            self._emitted.append((ips, window_features(counts, ports, self.window)))
+
+    def _emit_slots(self, slots):
+        slots = slots[self.counts[slots, _PACKETS] > 0]
+        self._emit(self.ip[slots], self.counts[slots], self.ports[slots])
+        self.counts[slots] = 0
+        self.ports[slots] = 0
+
+    def _collect(self):
+        if not self._emitted:
+            return np.empty(0, dtype=np.int64), np.empty((0, FLOW_FEATURE_COUNT))
+        ips = np.concatenate([e[0] for e in self._emitted])
+        X = np.concatenate([e[1] for e in self._emitted])
+        self._emitted = []
+        return ips, X
+
+    # --- Slot management ---
+    def _release(self, slots):
+        for slot in slots.tolist():
+            del self.slot_of[int(self.ip[slot])]
+            self.ip[slot] = -1
+            self.free.append(slot)
+
+    def _evict(self, count, protected):
+        """Evicts up to `count` least recently seen slots not used by this batch."""
+        used = np.flatnonzero(self.ip >= 0)
+        used = used[~np.isin(used, protected)]
+        count = min(count, len(used))
+        if count <= 0:
+            return
+        oldest = used[np.argpartition(self.last_seen[used], count - 1)[:count]]
+        self._emit_slots(oldest)
+        self._release(oldest)
+        self.evictions += count
+
+    def _assign(self, uniq_ips, now):
+        """Returns a slot per unique IP (-1 if the table can't fit it)."""
+        slots = np.fromiter((self.slot_of.get(ip, -1) for ip in uniq_ips.tolist()),
+                            dtype=np.int64, count=len(uniq_ips))
+        missing = np.flatnonzero(slots < 0)
+        if len(missing) > len(self.free):
+            self._evict(max(len(missing) - len(self.free), self.capacity // 16), slots[slots >= 0])
+        for i in missing.tolist():
+            if not self.free:
+                break
+            slot = self.free.pop()
+            ip = int(uniq_ips[i])
+            self.slot_of[ip] = slot
+            self.ip[slot] = ip
+            self.wid[slot] = 0
+            self.last_seen[slot] = now
+            slots[i] = slot
+        return slots
+
+    # --- Public API ---
+    def update(self, src_ips, features, times):
+        """
+        Adds a batch of packets.
+        src_ips: (n,) uint32 IPs, features: (n, 4) [frame_len, port, proto, flags],
+        times: (n,) epoch seconds.
+        Returns: (ips, X) records for every window that closed.
+        """
+        if len(src_ips):
+            self.clock = max(self.clock, float(np.max(times)))
+            uniq, inverse = np.unique(src_ips, return_inverse=True)
+            slots = self._assign(uniq, self.clock)[inverse.reshape(-1)]
+            keep = slots >= 0
+            if not keep.all():
+                self.dropped += int((~keep).sum())
+                slots, features, times = slots[keep], features[keep], times[keep]
+            if len(slots):
+                self._add(slots, features, times)
+        self._expire()
+        return self._collect()
+
+    def _add(self, slots, features, times):
+        wids = np.floor(times / self.window).astype(np.int64)
+
+        per = np.empty((len(slots), 5), dtype=np.int64)
+        per[:, _PACKETS] = 1
+        per[:, _BYTES] = features[:, 0]
+        flags = features[:, 3]
+        per[:, _SYN] = ((flags & 0x02) != 0) & ((flags & 0x10) == 0)
+        per[:, _ACK] = (flags & 0x10) != 0
+        per[:, _UDP] = features[:, 2] == 17
+
+        bit = features[:, 1] % PORT_BITS
+        bits = np.zeros((len(slots), _WORDS), dtype=np.uint64)
+        bits[np.arange(len(slots)), bit // 64] = np.left_shift(np.uint64(1), (bit % 64).astype(np.uint64))
+
+        # Group packets by (slot, window)
+        order = np.lexsort((wids, slots))
+        s_sorted, w_sorted = slots[order], wids[order]
+        boundary = np.ones(len(order), dtype=bool)
+        boundary[1:] = (s_sorted[1:] != s_sorted[:-1]) | (w_sorted[1:] != w_sorted[:-1])
+        starts = np.flatnonzero(boundary)
+        g_slot = s_sorted[starts]
+        g_wid = w_sorted[starts]
+        g_counts = np.add.reduceat(per[order], starts, axis=0)
+        g_ports = np.bitwise_or.reduceat(bits[order], starts, axis=0)
+        g_last = np.ones(len(starts), dtype=bool)
+        g_last[:-1] = g_slot[1:] != g_slot[:-1]
+
+        last_times = np.maximum.reduceat(times[order], starts)
+        self.last_seen[g_slot] = np.maximum(self.last_seen[g_slot], last_times)
+
+        # Windows the slot already emitted are closed: drop their packets
+        late = g_wid < self.wid[g_slot]
+        if late.any():
+            self.late_packets += int(g_counts[late, _PACKETS].sum())
+
+        # The current window merges into the table
+        newer = g_wid > self.wid[g_slot]
+        merge = ~newer & ~late
+        np.add.at(self.counts, g_slot[merge], g_counts[merge])
+        np.bitwise_or.at(self.ports, g_slot[merge], g_ports[merge])
+
+        # A slot moving to a newer window closes the one it holds
+        self._emit_slots(np.unique(g_slot[newer]))
+
+        # Newer windows entirely inside this batch are already complete
+        complete = newer & ~g_last
+        self._emit(self.ip[g_slot[complete]], g_counts[complete], g_ports[complete])
+
+        # The latest window of each slot becomes its open window
+        opened = newer & g_last
+        self.counts[g_slot[opened]] = g_counts[opened]
+        self.ports[g_slot[opened]] = g_ports[opened]
+        self.wid[g_slot[opened]] = g_wid[opened]
+
+    def expire(self, now):
+        """
+        Closes windows that ended before `now` and frees idle slots.
+        Call with wall-clock time when the link is quiet.
+        Returns: (ips, X) for the windows that closed.
+        """
+        self.clock = max(self.clock, now)
+        self._expire()
+        return self._collect()
+
+    def _expire(self):
+        used = np.flatnonzero(self.ip >= 0)
+        current = np.int64(np.floor(self.clock / self.window))
+        closed = used[self.wid[used] < current]
+        self._emit_slots(closed)
+        self.wid[closed] = current # Later packets for the emitted windows count as late
+        idle = used[self.last_seen[used] < self.clock - self.idle_timeout]
+        if len(idle):
+            self._release(idle)
+
+    def flush(self):
+        """Emits every open window (end of a replay or training capture)."""
+        self._emit_slots(np.flatnonzero(self.ip >= 0))
+        return self._collect()
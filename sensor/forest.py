@@ -0,0 +1,192 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+# Scores from the flat evaluator must match sklearn's decision_function this closely
+TOLERANCE = 1e-9
+# Rows walked together; keeps the (rows, trees) node matrix cache resident
+CHUNK_ROWS = 128
+_EULER_GAMMA = 0.5772156649015329
+
+def average_path_length(n):
+    """c(n): average path length of an unsuccessful BST search over n samples."""
+    if n <= 1:
+        return 0.0
+    if n == 2:
+        return 1.0
+    return 2.0 * (math.log(n - 1.0) + _EULER_GAMMA) - 2.0 * (n - 1.0) / n
+
+class FlatForest:
+    """
+    An IsolationForest flattened into plain arrays, evaluated with NumPy only.
+
+    All trees share one node table; children[2 * node + (x > threshold)] is
+    the next node. Leaves point to themselves with an infinite threshold, so
+    every sample can take exactly max_depth steps without branching on "is
+    this a leaf". A leaf's value is its depth plus c(n_node_samples), i.e.
+    the path length sklearn charges for ending there.
+
+    Unlike sklearn there is no per-call validation or joblib dispatch, which
+    dominates the cost of the small (cache miss) batches the sensor scores.
+    """
+    ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+    def __init__(self, feature, threshold, children, value, roots,
+                 offset, denominator, max_depth, n_features):
+        self.feature = feature.astype(np.intp)
+        self.threshold = threshold
+        self.children = children.astype(np.intp)
+        self.value = value
+        self.roots = roots.astype(np.intp)
+        self.offset_ = float(offset)
+        self.denominator = float(denominator)
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flattens a fitted sklearn IsolationForest."""
+        features, thresholds, children, values, roots = [], [], [], [], []
+        base = 0
+        max_depth = 0
+        for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+
+            depth = np.zeros(n, dtype=np.int64)
+            for node in range(n):  # children always come after their parent
+                if not is_leaf[node]:
+                    depth[t.children_left[node]] = depth[node] + 1
+                    depth[t.children_right[node]] = depth[node] + 1
+            max_depth = max(max_depth, int(depth.max()))
+
+            own = np.arange(n)
+            # Tree feature indices refer to the tree's own feature subset
+            features.append(np.where(is_leaf, 0, np.asarray(tree_features)[np.maximum(t.feature, 0)]))
+            thresholds.append(np.where(is_leaf, np.inf, t.threshold))
+            pairs = np.stack((np.where(is_leaf, own, t.children_left),
+                              np.where(is_leaf, own, t.children_right)), axis=1)
+            children.append(base + pairs.ravel())
+            leaf_c = np.array([average_path_length(s) for s in t.n_node_samples])
+            values.append(np.where(is_leaf, depth + leaf_c, 0.0))
+            roots.append(base)
+            base += n
+
+        return cls(
+            feature = np.concatenate(features).astype(np.int32),
+            threshold = np.concatenate(thresholds).astype(np.float64),
+            children = np.concatenate(children).astype(np.int32),
+            value = np.concatenate(values).astype(np.float64),
+            roots = np.array(roots, dtype=np.int32),
+            offset = model.offset_,
+            denominator = len(model.estimators_) * average_path_length(model.max_samples_),
+            max_depth = max_depth,
+            n_features = model.n_features_in_
+        )
+
+    # --- Persistence ---
+    def save(self, path):
+        arrays = {
+            "feature": self.feature.astype(np.int32),
+            "threshold": self.threshold,
+            "children": self.children.astype(np.int32),
+            "value": self.value,
+            "roots": self.roots.astype(np.int32)
+        }
+        np.savez(path, offset=self.offset_, denominator=self.denominator,
+                 max_depth=self.max_depth, n_features=self.n_features_in_, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            arrays = {name: f[name] for name in cls.ARRAYS}
+            return cls(offset=f["offset"], denominator=f["denominator"],
+                       max_depth=f["max_depth"], n_features=f["n_features"], **arrays)
+
+    # --- Scoring ---
+    def path_lengths(self, X):
+        """Sum over trees of each row's path length. X: (n, n_features) float64."""
+        n = len(X)
+        flat_X = X.ravel()
+        row_base = (np.arange(n, dtype=np.intp) * self.n_features_in_)[:, None]
+        node = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            x = flat_X[row_base + self.feature[node]]
+            node = self.children[2 * node + (x > self.threshold[node])]
+        return self.value[node].sum(axis=1)
+
+    def score_samples(self, X):
+        # sklearn's trees compare float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1]} features, but the model is expecting {self.n_features_in_}")
+        if self.denominator == 0:
+            return -np.ones(len(X))
+        depths = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            depths[start:start + CHUNK_ROWS] = self.path_lengths(X[start:start + CHUNK_ROWS])
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+def export_model(model_path, out_path, samples=None):
+    """
+    Converts a joblib'd sklearn IsolationForest to a FlatForest .npz and checks
+    the scores still match on `samples` (random feature rows if not given).
+    Returns the largest absolute score difference.
+    """
+    import joblib
+    model = joblib.load(model_path)
+    if hasattr(model, "feature_names_in_"):
+        del model.feature_names_in_
+    flat = FlatForest.from_sklearn(model)
+
+    if samples is None:
+        rng = np.random.default_rng(0)
+        samples = rng.integers(0, 65536, size=(5000, model.n_features_in_))
+    diff = float(np.max(np.abs(flat.decision_function(samples) - model.decision_function(samples))))
+    if diff > TOLERANCE:
+        raise ValueError(f"Flat forest differs from {model_path} by {diff:.3g}")
+
+    flat.save(out_path)
+    return diff
+
+def benchmark(model_path, flat_path, batches=(64, 4096), rounds=20):
+    """Prints load time and per-batch scoring time for both formats."""
+    t0 = time.perf_counter()
+    import joblib
+    model = joblib.load(model_path)
+    if hasattr(model, "feature_names_in_"):
+        del model.feature_names_in_
+    load_pkl = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    flat = FlatForest.load(flat_path)
+    load_flat = time.perf_counter() - t0
+
+    rng = np.random.default_rng(1)
+    for name, m, load in (("sklearn", model, load_pkl), ("flat", flat, load_flat)):
+        timings = []
+        for batch in batches:
+            X = rng.integers(0, 65536, size=(batch, flat.n_features_in_))
+            t0 = time.perf_counter()
+            for _ in range(rounds):
+                m.decision_function(X)
+            timings.append(f"batch({batch})={(time.perf_counter() - t0) / rounds * 1000:.2f}ms")
+        print(f"   {name:<8} load={load * 1000:.1f}ms  " + "  ".join(timings))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an IsolationForest pickle to the flat .npz format")
+    parser.add_argument("model", nargs="?", default="model.pkl")
+    parser.add_argument("output", nargs="?", help="Defaults to the model path with a .npz suffix")
+    parser.add_argument("--bench", action="store_true", help="Compare load and scoring time afterwards")
+    args = parser.parse_args()
+
+    output = args.output or args.model.rsplit(".", 1)[0] + ".npz"
+    diff = export_model(args.model, output)
+    print(f"✅ Exported {args.model} -> {output} (max score diff {diff:.2e})")
+    if args.bench:
+        benchmark(args.model, output)
@@ -0,0 +1,89 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from stats import LATENCY_BUCKETS
+
+PREFIX = "nids_sensor_"
+
+# name -> (type, help). Values come from the sensor's collect_metrics() snapshot.
+METRICS = {
+    "packets_read": ("counter", "Packets read from the capture"),
+    "parse_failures": ("counter", "Captured lines/frames that could not be parsed"),
+    "whitelisted": ("counter", "Packets dropped by the source IP whitelist"),
+    "packets_scored": ("counter", "Rows scored by the model (packets or flow windows)"),
+    "batches_scored": ("counter", "Model calls"),
+    "alerts_detected": ("counter", "Alerts that passed the per-IP rate limit"),
+    "alerts_sent": ("counter", "Alerts accepted by the controller"),
+    "alerts_spooled": ("counter", "Alerts written to the on-disk spool"),
+    "alerts_suppressed": ("counter", "Alerts held back by the per-IP rate limit"),
+    "capture_drops": ("counter", "Frames the kernel dropped before the sensor read them"),
+    "packets_shed": ("counter", "Packets skipped by load shedding"),
+    "queue_depth": ("gauge", "Alerts waiting in the spool"),
+    "worker_backlog": ("gauge", "Packets waiting in the worker rings"),
+    "pipe_backlog_bytes": ("gauge", "Bytes tshark has written that the sensor hasn't read"),
+    "rss_mb": ("gauge", "Resident set size of the sensor process in MB"),
+    "cpu_load": ("gauge", "System CPU load percent"),
+    "score_cache_hit_rate": ("gauge", "Score cache hit rate"),
+    "shed_ratio": ("gauge", "Share of packets read that load shedding skipped"),
+    "shedding": ("gauge", "1 while the sensor is shedding load"),
+    "lag_ms": ("gauge", "How far scoring lags behind the capture (ms)"),
+}
+
+def render(snapshot, histograms):
+    """
+    Prometheus text exposition of a metrics snapshot.
+    histograms: {name: StageTimer}, exported as <name>_seconds histograms.
+    """
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        value = snapshot.get(name)
+        if value is None:
+            continue
+        metric = PREFIX + name + ("_total" if kind == "counter" else "")
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+
+    for name, timer in histograms.items():
+        metric = f"{PREFIX}{name}_seconds"
+        lines.append(f"# HELP {metric} Latency of the {name} stage")
+        lines.append(f"# TYPE {metric} histogram")
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, timer.buckets):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_bucket{{le="+Inf"}} {timer.count}')
+        lines.append(f"{metric}_sum {timer.total}")
+        lines.append(f"{metric}_count {timer.count}")
+    return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """
+    Serves GET /metrics on a loopback port from a background thread.
+    collect() returns (snapshot, histograms) for render().
+    """
+    def __init__(self, port, collect, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = render(*collect()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Don't print a line per scrape
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        host, port = self.server.server_address[:2]
+        print(f"📈 Metrics on http://{host}:{port}/metrics")
+        return self
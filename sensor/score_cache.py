@@ -0,0 +1,113 @@
+from collections import OrderedDict
+
+import numpy as np
+
+# Packed key layout: frame_len (16 bits) | port (16) | proto (8) | flags (16)
+_FIELD_LIMITS = np.array([1 << 16, 1 << 16, 1 << 8, 1 << 16], dtype=np.int64)
+_FIELD_SHIFTS = np.array([40, 24, 16, 0], dtype=np.int64)
+
+class ScoreCache:
+    """
+    LRU cache of decision_function results keyed by the packet feature tuple
+    (frame_len, port, proto, flags). Real traffic repeats the same few tuples,
+    so most of a batch is answered without touching the model.
+
+    port_bucket / len_bucket > 1 round those fields down before keying (and
+    scoring), trading a little precision for a much smaller key space.
+    The cache clears itself when it's used with a different model object.
+    """
+    def __init__(self, capacity=65536, port_bucket=1, len_bucket=1):
+        self.capacity = capacity
+        self.port_bucket = max(int(port_bucket), 1)
+        self.len_bucket = max(int(len_bucket), 1)
+        self.entries = OrderedDict()
+        self.model = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+
+    def bucket(self, X):
+        """Rounds port and frame_len down to their buckets (a copy if anything changes)."""
+        if self.port_bucket == 1 and self.len_bucket == 1:
+            return X
+        X = X.copy()
+        X[:, 0] -= X[:, 0] % self.len_bucket
+        X[:, 1] -= X[:, 1] % self.port_bucket
+        return X
+
+    def score(self, model, X):
+        """
+        X: (n, 4) int64 packet features.
+        Returns raw decision_function scores, calling the model only for
+        feature tuples not already cached.
+        """
+        if model is not self.model:
+            self.clear()
+            self.model = model
+
+        X = self.bucket(X)
+        raw = np.empty(len(X), dtype=np.float64)
+
+        # Tuples that don't fit the packed key are scored directly
+        packable = ((X >= 0) & (X < _FIELD_LIMITS)).all(axis=1)
+        if not packable.all():
+            odd = ~packable
+            raw[odd] = model.decision_function(X[odd])
+            self.misses += int(odd.sum())
+            rows = np.flatnonzero(packable)
+            if len(rows):
+                raw[rows] = self._score_packable(model, X[rows])
+            return raw
+
+        raw[:] = self._score_packable(model, X)
+        return raw
+
+    def _score_packable(self, model, X):
+        keys = (X << _FIELD_SHIFTS).sum(axis=1)
+        uniq, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+        values = np.empty(len(uniq), dtype=np.float64)
+        missing = []
+        entries = self.entries
+        for i, key in enumerate(uniq.tolist()):
+            value = entries.get(key)
+            if value is None:
+                missing.append(i)
+            else:
+                entries.move_to_end(key)
+                values[i] = value
+
+        if missing:
+            missing = np.array(missing)
+            scores = model.decision_function(X[first[missing]])
+            values[missing] = scores
+            for key, value in zip(uniq[missing].tolist(), scores.tolist()):
+                entries[key] = value
+            overflow = len(entries) - self.capacity
+            for _ in range(max(overflow, 0)):
+                entries.popitem(last=False)
+            self.evictions += max(overflow, 0)
+
+        # Hits and misses are counted per packet, not per unique tuple
+        counts = np.bincount(inverse.reshape(-1), minlength=len(uniq))
+        missed = int(counts[missing].sum()) if len(missing) else 0
+        self.misses += missed
+        self.hits += len(X) - missed
+        return values[inverse.reshape(-1)]
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -1,15 +1,27 @@
-import subprocess
 import requests
 import time
 import os
 import urllib3
 import json
 import threading
+import argparse
+import signal
 import psutil
-from collections import deque
 from dotenv import load_dotenv
-from features import parse_tshark_line
-from detector import AnomalyDetector
+import numpy as np
+from features import u32_to_ip, FEATURE_COUNT
+from detector import AnomalyDetector, ModelWatcher
+from stats import PipelineStats
+from capture import open_capture
+from capture_filter import CaptureFilter
+from batcher import AdaptiveBatcher
+from workers import WorkerPool
+from transport import ControllerClient
+from spool import AlertSpool
+from suppression import AlertSuppressor
+from metrics import MetricsServer
+from shedding import LoadShedder
+from flows import FlowTable
 
 # --- CONFIGURATION ---
 with open("config.json") as config :
@@ -21,108 +33,244 @@ if os.getenv("API_KEY"):
 CONTROLLER_URL = data.get("controller_url")
 #create a heartbeat url to replace 'alert' with 'heartbeat'
 HEARTBEAT_URL = CONTROLLER_URL.replace("alert","heartbeat")
+# Several alerts at once go to the bulk endpoint (gzip'd JSON array)
+ALERT_BATCH_URL = data.get("controller_batch_url", CONTROLLER_URL.rsplit("/alert", 1)[0] + "/alerts/batch")
 API_KEY = data.get("API_KEY")
 INTERFACE = data.get("interface")
+CAPTURE_BACKEND = data.get("capture_backend", "tshark") # "tshark" or "native" (in-process decoder)
 BATCH_SIZE = data.get("batch_size")
+MIN_BATCH_SIZE = data.get("min_batch_size", 1)
+MAX_BATCH_SIZE = data.get("max_batch_size", 4096)
+MAX_BATCH_LATENCY = data.get("max_batch_latency_ms", 50) / 1000.0
 SENSOR_ID = data.get("sensor_id")
 MODEL_PATH = data.get("model_path")
 THRESHOLD = data.get("threshold")
 WHITELIST = data.get("whitelist", ["127.0.0.1"])
+CAPTURE_EXCLUDE_NETS = data.get("capture_exclude_nets", []) # Trusted source subnets, never scored
+CAPTURE_EXCLUDE_PORTS = data.get("capture_exclude_ports", []) # Trusted TCP/UDP destination ports, never scored
+CONFIG_CHECK_INTERVAL = 2 # Seconds between checks of config.json for whitelist changes
 CERT_PATH = data.get("cert_path", "cert.pem") # Path to the certificate copied from controller
+WORKERS = data.get("workers", 0) # >1 scores on that many IP-sharded worker processes
+MODE = data.get("mode", "packet") # "packet" scores every packet, "flow" scores per-IP windows
+FLOW_WINDOW = data.get("flow_window", 5)
+FLOW_CAPACITY = data.get("flow_capacity", 65536)
+FLOW_IDLE_TIMEOUT = data.get("flow_idle_timeout", 60)
+if MODE == "flow":
+    MODEL_PATH = data.get("flow_model_path", "flow_model.npz")
+SCORE_CACHE_SIZE = data.get("score_cache_size", 65536) # LRU of packet scores per feature tuple, 0 disables
+SCORE_CACHE_PORT_BUCKET = data.get("score_cache_port_bucket", 1)
+SCORE_CACHE_LEN_BUCKET = data.get("score_cache_len_bucket", 1)
+CONTROLLER_TIMEOUT = data.get("controller_timeout", 2) # Seconds; connections are kept alive, so this rarely includes a handshake
+SPOOL_PATH = data.get("spool_path", "alert_spool.db") # Alerts the controller hasn't accepted yet
+SPOOL_MAX_ALERTS = data.get("spool_max_alerts", 10000)
+SPOOL_OVERFLOW = data.get("spool_overflow", "coalesce") # "coalesce" per IP or "drop"
+SPOOL_MIN_BACKOFF = 0.5
+SPOOL_MAX_BACKOFF = 30
+LATENCY_BUDGET = data.get("latency_budget_ms", 500) / 1000.0 # Shed bulk traffic when lagging more than this, 0 disables
+SHED_SAMPLE_RATE = data.get("shed_sample_rate", 0.1) # Share of bulk packets still scored while shedding
+SHED_BACKLOG_BYTES = data.get("shed_backlog_bytes", 4 * 1024 * 1024)
+MODEL_RELOAD_INTERVAL = data.get("model_reload_interval", 5) # Seconds between model file checks, 0 disables (SIGHUP still works)
+METRICS_PORT = data.get("metrics_port", 9108) # Prometheus /metrics on 127.0.0.1, 0 disables
+CPU_SAMPLE_INTERVAL = data.get("cpu_sample_interval", 5) # Seconds; CPU load is sampled once per interval for /metrics and the heartbeat
+ALERT_MIN_CONFIDENCE = 20
+ALERT_COOLDOWN = 30 # Rate Limit (30s) per IP
+ALERT_SUPPRESS_CAPACITY = data.get("alert_suppress_capacity", 100000) # Max IPs tracked by the rate limit
 
 # --- INITIALIZATION ---
-detector = AnomalyDetector(
-    model_path = MODEL_PATH,
-    threshold = THRESHOLD
+# With worker processes each worker loads its own model; the main process never scores
+detector = None
+if WORKERS <= 1:
+    detector = AnomalyDetector(
+        model_path = MODEL_PATH,
+        threshold = THRESHOLD,
+        cache_size = SCORE_CACHE_SIZE,
+        port_bucket = SCORE_CACHE_PORT_BUCKET,
+        len_bucket = SCORE_CACHE_LEN_BUCKET
+    )
+# Note: If you get a "Hostname Mismatch", it's because the cert
+# was issued for 'localhost' or another name, not the IP.
+client = ControllerClient(API_KEY, CERT_PATH)
+suppressor = AlertSuppressor(ALERT_COOLDOWN, ALERT_SUPPRESS_CAPACITY)
+spool = None # AlertSpool, opened once the run mode is known (in memory for replays/dry runs)
+stats = PipelineStats()
+batcher = AdaptiveBatcher(
+    initial_size = BATCH_SIZE,
+    min_size = MIN_BATCH_SIZE,
+    max_size = MAX_BATCH_SIZE,
+    max_latency = MAX_BATCH_LATENCY
 )
-last_alert_time = {}
-QUEUE=deque()
+stats.batcher = batcher
+flows = FlowTable(FLOW_WINDOW, FLOW_CAPACITY, FLOW_IDLE_TIMEOUT) if MODE == "flow" else None
+stats.flows = flows
+# Packet mode only: sampling packets would skew the per-window rates flow mode scores
+shedder = LoadShedder(LATENCY_BUDGET, SHED_SAMPLE_RATE, SHED_BACKLOG_BYTES) if LATENCY_BUDGET and MODE == "packet" else None
+stats.shedding = shedder.metrics if shedder else None
+stats.cache = detector.cache_metrics if detector else None
+stats.transport = client.metrics
+stats.suppression = suppressor.metrics
+pool = None # WorkerPool when WORKERS > 1
+# Whitelist + exclusions, pushed into the kernel capture filter and re-applied after parsing
+capture_filter = CaptureFilter(WHITELIST, CAPTURE_EXCLUDE_NETS, CAPTURE_EXCLUDE_PORTS)
+capture_reader = None # Current capture reader, for pipe backlog / kernel drop metrics
+PROCESS = psutil.Process()
+cpu_load = 0.0 # Last CPU load sample, see sample_cpu()
+DRY_RUN = False # Replay/benchmark runs can skip the controller entirely
+batch_supported = True # Cleared if the controller has no /alerts/batch
 
 # Silence SSL Warnings only if we are forced to use verify=False
 # urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-def send_alert(ip, score):
+def alert_payload(ip, score, suppressed=0):
+    return {
+        "sensor_id": SENSOR_ID,
+        "ip": ip,
+        "score": score,
+        "suppressed": suppressed # Hits rate limited since this IP's last alert
+    }
+
+def retry_after_seconds(response):
+    """Retry-After (in seconds) from a 429/503, capped at SPOOL_MAX_BACKOFF; 0 if absent."""
     try:
-        payload = {
-            "sensor_id": SENSOR_ID,
-            "ip": ip,
-            "score": score
-        }
-        
-        # SSL Verification Logic
-        verify_param = False
-        if os.path.exists(CERT_PATH):
-            verify_param = CERT_PATH
-            # Note: If you get a "Hostname Mismatch", it's because the cert 
-            # was issued for 'localhost' or another name, not the IP.
-        
-        requests.post(
-            CONTROLLER_URL, 
-            json=payload, 
-            headers={"X-NIDS-Auth": API_KEY}, 
-            verify=verify_param, 
-            timeout=1
-        )
-        print(f"🚀 Alert Sent: {ip} (Conf: {score:.1f})")
+        return min(float(response.headers.get("Retry-After", 0)), SPOOL_MAX_BACKOFF)
+    except ValueError:
+        return 0
+
+def is_busy(status):
+    """The controller is down or pushing back: keep the alert and try again later."""
+    return status == 429 or status >= 500
+
+def post_alerts(payloads):
+    """
+    Sends alerts to the controller: one POST /alert for a single alert,
+    one POST /alerts/batch for several. Returns (HTTP status per payload,
+    Retry-After seconds). Raises requests exceptions if the controller is
+    unreachable.
+    """
+    global batch_supported
+    if len(payloads) > 1 and batch_supported:
+        r = client.post_batch(ALERT_BATCH_URL, payloads, timeout=CONTROLLER_TIMEOUT)
+        if r.status_code in (404, 405):
+            batch_supported = False # Older controller: one request per alert
+            print("⚠️ Controller has no batch endpoint, sending alerts one by one")
+        elif r.status_code == 200:
+            results = r.json().get("results", [])
+            if len(results) == len(payloads):
+                return [item.get("status", 500) for item in results], retry_after_seconds(r)
+            return [500] * len(payloads), 0
+        else:
+            return [r.status_code] * len(payloads), retry_after_seconds(r)
+
+    statuses = []
+    for payload in payloads:
+        r = client.post(CONTROLLER_URL, payload, timeout=CONTROLLER_TIMEOUT)
+        statuses.append(r.status_code)
+        if is_busy(r.status_code):
+            # Don't hammer an overloaded controller with the rest
+            return statuses + [r.status_code] * (len(payloads) - len(statuses)), retry_after_seconds(r)
+    return statuses, 0
+
+def send_alerts(payloads):
+    if DRY_RUN:
+        for p in payloads:
+            print(f"🧪 [DRY RUN] Alert: {p['ip']} (Conf: {p['score']:.1f}, Suppressed: {p['suppressed']})")
+        return
+    # While a backlog is draining, keep order and don't stall capture on a dead controller
+    if len(spool):
+        for p in payloads:
+            spool.push(p)
+        return
+    try:
+        statuses, _ = post_alerts(payloads)
     except requests.exceptions.SSLError as e:
         print(f"🔒 SSL Error: {e}")
-
+        return
     except requests.RequestException:
-        QUEUE.append(payload)
-        print(f"❌ Controller Down , Queueing the alerts! {ip}")
+        for p in payloads:
+            spool.push(p)
+        print(f"❌ Controller Down , Spooling the alerts! {', '.join(p['ip'] for p in payloads)}")
+        return
     except Exception as e:
         print(f"❌ Controller Error: {e}")
+        return
+
+    for p, status in zip(payloads, statuses):
+        if is_busy(status):
+            # Controller is overloaded: the retry thread resends once it says so
+            spool.push(p)
+            print(f"⏳ Controller busy ({status}), Spooling the alert! {p['ip']}")
+        elif status >= 400:
+            print(f"❌ Controller rejected alert for {p['ip']} ({status})")
+        else:
+            stats.alerts_sent += 1
+            print(f"🚀 Alert Sent: {p['ip']} (Conf: {p['score']:.1f})")
 
 def retry_worker():
-    verify_param = False
-    if os.path.exists(CERT_PATH):
-            verify_param = CERT_PATH
+    """
+    Drains the spool as fast as the controller accepts alerts (100 per
+    batch request), backing off exponentially while it's down or pushing back.
+    """
+    backoff = SPOOL_MIN_BACKOFF
     while True:
-        if QUEUE:
-            payload = QUEUE[0]
-            try:
-                r=requests.post(
-                    CONTROLLER_URL, 
-                    json=payload, 
-                    headers={"X-NIDS-Auth": API_KEY}, 
-                    verify=verify_param, 
-                    timeout=1
-                )
-                r.raise_for_status()
-                print(f"🚀 Queue Alert Sent: {payload["ip"]} (Conf: {payload["score"]:.1f})")
-                QUEUE.popleft()
-            except requests.RequestException:
-                pass # controller still down
-        time.sleep(2)
+        batch = spool.peek(100)
+        if not batch:
+            time.sleep(0.5)
+            continue
+
+        try:
+            statuses, retry_after = post_alerts([payload for _, payload in batch])
+        except requests.RequestException:
+            statuses, retry_after = [], 0 # controller still down
+        sent, rejected = [], []
+        for (row_id, _), status in zip(batch, statuses):
+            if is_busy(status):
+                continue
+            # Any other 4xx will never be accepted, don't retry it forever
+            (rejected if status >= 400 else sent).append(row_id)
+        spool.remove(sent)
+        spool.remove(rejected, sent=False)
+        stats.alerts_sent += len(sent)
+
+        if sent:
+            print(f"🚀 Spooled Alerts Sent: {len(sent)} ({len(spool)} left)")
+        if len(sent) + len(rejected) < len(batch):
+            time.sleep(max(backoff, retry_after))
+            backoff = min(backoff * 2, SPOOL_MAX_BACKOFF)
+        else:
+            backoff = SPOOL_MIN_BACKOFF
 
 def send_heartbeat():
     """
     Runs in a background thread. Sends a heartbeat to the controller every 30s.
     """
+    last_beat = [] # [time, packets_read] of the previous heartbeat
     while True:
         try:
 
-            CPU_LOAD = psutil.cpu_percent(interval=None)
+            snapshot, histograms = collect_metrics()
+            CPU_LOAD = snapshot["cpu_load"]
+            now = time.time()
+            if last_beat:
+                elapsed = max(now - last_beat[0], 1e-9)
+                snapshot["packets_per_sec"] = (snapshot["packets_read"] - last_beat[1]) / elapsed
+            last_beat[:] = [now, snapshot["packets_read"]]
+            predict = histograms.get("predict")
+            if predict:
+                snapshot["model_latency_ms"] = predict.summary()
 
-            # Create the small JSON payload
+            # Create the JSON payload
             payload = {
                 "sensor_id": SENSOR_ID,
-                "cpu_load": CPU_LOAD
+                "cpu_load": CPU_LOAD,
+                "metrics": snapshot,
+                "model": pool.model_metadata() if pool else detector.get_model_metadata(),
+                "score_cache": pool.cache_metrics() if pool else detector.cache_metrics(),
+                "transport": client.metrics(),
+                "spool": spool.metrics(),
+                "suppression": pool.suppression_metrics() if pool else suppressor.metrics()
             }
-            
-            # SSL Logic (same as send_alert)
-            verify_param = False
-            if os.path.exists(CERT_PATH):
-                verify_param = CERT_PATH
-
-            # Send the request
-            requests.post(
-                HEARTBEAT_URL, 
-                json=payload, 
-                headers={"X-NIDS-Auth": API_KEY}, 
-                verify=verify_param, 
-                timeout=2
-            )
+
+            # Send the request (on the shared keep-alive connection)
+            client.post(HEARTBEAT_URL, payload, timeout=CONTROLLER_TIMEOUT)
             # Optional: Print to console for debugging (can remove later)
             print(f"💓 Heartbeat sent to {HEARTBEAT_URL}")
             
@@ -132,68 +280,309 @@ def send_heartbeat():
         
         time.sleep(30)
 
-def monitor_traffic():
-    cmd = [
-        "tshark", "-i", INTERFACE,
-        "-T", "fields",
-        "-e", "ip.src",
-        "-e", "frame.len",
-        "-e", "tcp.dstport",
-        "-e", "udp.dstport",
-        "-e", "ip.proto",
-        "-e", "tcp.flags",
-        "-E", "separator=,",
-        "-l"
-    ]
+def sample_cpu():
+    """
+    Runs in a background thread. cpu_percent(interval=None) measures since its
+    previous call, so /metrics scrapes and heartbeats calling it would reset
+    each other's window; one sampler on a fixed interval feeds both.
+    """
+    global cpu_load
+    while True:
+        cpu_load = psutil.cpu_percent(interval=CPU_SAMPLE_INTERVAL)
+
+def collect_metrics():
+    """
+    Snapshot of the sensor counters for the heartbeat and the /metrics endpoint.
+    Returns: (snapshot dict, {stage: StageTimer} latency histograms)
+    """
+    cache = pool.cache_metrics() if pool else detector.cache_metrics()
+    suppression = pool.suppression_metrics() if pool else suppressor.metrics()
+    backlog = getattr(capture_reader, "backlog", None)
+    drops = getattr(capture_reader, "drops", None)
+    predict = stats.stages.get("predict")
+    snapshot = {
+        "packets_read": stats.packets,
+        "parse_failures": stats.parse_failures,
+        "whitelisted": stats.whitelisted,
+        "packets_scored": stats.scored,
+        "batches_scored": predict.count if predict else 0,
+        "alerts_detected": stats.alerts,
+        "alerts_sent": stats.alerts_sent,
+        "alerts_spooled": spool.pushed,
+        "alerts_suppressed": suppression["suppressed"] if suppression else 0,
+        "capture_drops": drops() if drops else None,
+        "queue_depth": len(spool),
+        "worker_backlog": pool.depth() if pool else 0,
+        "pipe_backlog_bytes": backlog() if backlog else None,
+        "rss_mb": PROCESS.memory_info().rss / (1024 * 1024),
+        "cpu_load": cpu_load,
+        "score_cache_hit_rate": cache["hit_rate"] if cache else None
+    }
+    if shedder:
+        shed = shedder.metrics()
+        snapshot["packets_shed"] = shed["packets_shed"]
+        snapshot["shed_ratio"] = shed["packets_shed"] / stats.packets if stats.packets else 0.0
+        snapshot["shedding"] = int(shed["shedding"])
+        snapshot["lag_ms"] = shed["lag_ms"]
+    histograms = {name: stats.stages[name] for name in ("predict", "parse") if name in stats.stages}
+    return snapshot, histograms
+
+def score_batch(batch_ips, batch_features):
+    """
+    Scores one parsed batch (ndarrays) and dispatches alerts, rate limited per IP.
+    """
+    t0 = time.perf_counter()
+    raw_scores, confidences = detector.score_array(batch_features)
+    stats.observe("predict", time.perf_counter() - t0)
+    stats.scored += len(batch_features)
     
+    alerts = []
+    for i in np.flatnonzero(confidences > ALERT_MIN_CONFIDENCE):
+        now = time.time()
+        
+        # Rate Limit (30s) per IP
+        suppressed = suppressor.check(int(batch_ips[i]), now)
+        if suppressed is None:
+            continue
+        
+        alerts.append((u32_to_ip(batch_ips[i]), raw_scores[i], float(confidences[i]), suppressed))
+    if alerts:
+        dispatch_alerts(alerts)
+
+def dispatch_alerts(alerts):
+    """
+    Sends (already rate limited) alerts: (ip, raw_score, conf, suppressed)
+    tuples, in one request when there are several. In worker mode this is
+    the single sender all worker alerts are merged into.
+    """
+    for ip, raw_score, conf, _ in alerts:
+        print(f"🚨 Anomaly Detected: {ip} | Score: {raw_score:.4f} | Conf: {conf:.1f}")
+    t0 = time.perf_counter()
+    send_alerts([alert_payload(ip, conf, suppressed) for ip, _, conf, suppressed in alerts])
+    stats.observe("dispatch", time.perf_counter() - t0)
+    stats.alerts += len(alerts)
+
+def process_block(items, parse, out, lagging=None):
+    """
+    Parses a block of captured items (tshark lines or native records) into
+    `out`, drops whitelisted sources and scores the rest (per packet, or per
+    closed flow window in flow mode). `lagging` (a LoadShedder) samples bulk
+    traffic down when the sensor falls behind the capture.
+    """
+    t0 = time.perf_counter()
+    src_ips, features, times = parse(items, out, with_time=True)
+    stats.observe("parse", time.perf_counter() - t0)
+    stats.parse_failures += len(items) - len(src_ips)
+    missing = np.isnan(times)
+    if lagging is not None:
+        newest = np.nanmax(times) if len(times) and not missing.all() else None
+        backlog = getattr(capture_reader, "backlog", None)
+        lagging.observe(time.time(), newest, backlog() if backlog else 0)
+    if missing.any():
+        times[missing] = time.time()
+
+    # Whitelist Self/Router to avoid feedback loops (anything the kernel filter let through)
+    keep = ~capture_filter.drop_mask(src_ips, features)
+    if not keep.all():
+        stats.whitelisted += len(keep) - int(keep.sum())
+        src_ips, features, times = src_ips[keep], features[keep], times[keep]
+
+    if lagging is not None:
+        keep = lagging.select(features)
+        if not keep.all():
+            src_ips, features, times = src_ips[keep], features[keep], times[keep]
+
+    if not len(features):
+        return
+    if pool:
+        pool.submit(src_ips, features, times)
+    elif flows is not None:
+        t0 = time.perf_counter()
+        src_ips, windows = flows.update(src_ips, features, times)
+        stats.observe("aggregate", time.perf_counter() - t0)
+        if len(windows):
+            score_batch(src_ips, windows)
+    else:
+        score_batch(src_ips, features)
+
+def expire_flows(final=False):
+    """Scores flow windows that closed while the link was quiet (or all of them at the end)."""
+    src_ips, windows = flows.flush() if final else flows.expire(time.time())
+    if len(windows):
+        score_batch(src_ips, windows)
+
+def reload_capture_filter():
+    """
+    Re-reads the whitelist and exclusions from config.json.
+    Returns the new CaptureFilter if they changed, else None.
+    """
+    global capture_filter
+    try:
+        with open("config.json") as config:
+            fresh = json.load(config)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not re-read config.json: {e}")
+        return None
+    new_filter = CaptureFilter(fresh.get("whitelist", ["127.0.0.1"]),
+                               fresh.get("capture_exclude_nets", []),
+                               fresh.get("capture_exclude_ports", []))
+    if new_filter == capture_filter:
+        return None
+    capture_filter = new_filter
+    print(f"🧹 Capture filter updated: {new_filter.expression() or 'no exclusions'}")
+    return new_filter
+
+def config_mtime():
+    try:
+        return os.stat("config.json").st_mtime_ns
+    except OSError:
+        return None
+
+def monitor_traffic(replay_file=None, realtime=False):
+    global capture_reader
     try:
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        print(f"👀 Sensor Active on {INTERFACE}...")
+        process, reader = open_capture(INTERFACE, replay_file, realtime, CAPTURE_BACKEND, capture_filter)
+        capture_reader = reader
+        # An as-fast-as-possible replay has no "real time" to lag behind
+        lagging = shedder if (realtime or not replay_file) else None
+        stats.started = time.time()
         
-        batch_data = []
-        batch_ips = []
+        # Flush on size or on the latency deadline, whichever comes first.
+        # Captured items are parsed per batch into a reusable feature buffer.
+        out = np.empty((MAX_BATCH_SIZE, FEATURE_COUNT), dtype=np.int64)
         
-        for line in process.stdout:
-            src_ip, features = parse_tshark_line(line)
+        last_expire = time.time()
+        last_config_check, last_mtime = time.time(), config_mtime()
+        
+        def flush(reason):
+            items, fill = batcher.take(reason)
+            stats.observe("batch", fill)
+            t0 = time.perf_counter()
+            process_block(items, reader.parse, out, lagging)
+            batcher.record(len(items), time.perf_counter() - t0)
+        
+        while True:
+            timeout = batcher.time_left()
+            if flows is not None and not pool and timeout is None:
+                timeout = 1.0 # Wake up to close flow windows on a quiet link
+            items = reader.read(timeout)
+            if items is None:
+                break
+            stats.packets += len(items)
+            batcher.extend(items)
             
-            if not features:
-                continue
+            reason = batcher.due()
+            while reason:
+                flush(reason)
+                reason = batcher.due()
 
-            # Whitelist Self/Router to avoid feedback loops
-            if src_ip in WHITELIST: 
-                continue
+            if flows is not None and not pool and not replay_file and time.time() - last_expire >= 1.0:
+                expire_flows()
+                last_expire = time.time()
 
-            batch_data.append(features)
-            batch_ips.append(src_ip)
-            
-            if len(batch_data) >= BATCH_SIZE:
-                results = detector.predict_batch(batch_data)
-                
-                for i, (raw_score, conf) in enumerate(results):
-                    if conf > 20:
-                        ip = batch_ips[i]
-                        now = time.time()
-                        
-                        # Rate Limit (30s) per IP
-                        if ip in last_alert_time and (now - last_alert_time[ip] < 30):
-                            continue
-                        
-                        print(f"🚨 Anomaly Detected: {ip} | Score: {raw_score:.4f} | Conf: {conf:.1f}")
-                        send_alert(ip, conf)
-                        last_alert_time[ip] = now
-                
-                batch_data = []
-                batch_ips = []
+            # Whitelist edits take effect without a restart: the kernel filter is
+            # swapped in place (native) or tshark is restarted with the new -f
+            if not replay_file and time.time() - last_config_check >= CONFIG_CHECK_INTERVAL:
+                last_config_check = time.time()
+                mtime = config_mtime()
+                if mtime != last_mtime:
+                    last_mtime = mtime
+                    new_filter = reload_capture_filter()
+                    if new_filter is not None and hasattr(reader, "set_filter"):
+                        reader.set_filter(new_filter)
+                    elif new_filter is not None and process:
+                        process.terminate()
+                        process.wait()
+                        process, reader = open_capture(INTERFACE, None, False, CAPTURE_BACKEND, new_filter)
+                        capture_reader = reader
+
+        # End of a replay: score whatever is left in the last partial batch
+        while batcher.items:
+            flush("eof")
+        if flows is not None and not pool:
+            expire_flows(final=True)
+
+        if process:
+            process.wait()
 
     except Exception as e:
         print(f"💥 Sensor Crash: {e}")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="NIDS sensor")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="Replay a pcap or saved tshark CSV dump instead of the live interface")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Replay at the original capture timing (default: as fast as possible)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Print alerts instead of sending them to the controller")
+    parser.add_argument("--report", metavar="FILE",
+                        help="Write the pipeline report as JSON when the run ends")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    heartbeat_thread = threading.Thread(target= send_heartbeat, daemon= True)
-    retry_thread = threading.Thread(target=retry_worker, daemon=True)
+    args = parse_args()
+    DRY_RUN = args.dry_run
+    # A replay or dry run must not leave alerts on disk for the next live run to send
+    spool = AlertSpool(":memory:" if args.replay or DRY_RUN else SPOOL_PATH, SPOOL_MAX_ALERTS, SPOOL_OVERFLOW)
+    stats.spool = spool.metrics
 
+    # Workers are forked, so start them before any other thread exists
+    if WORKERS > 1:
+        pool = WorkerPool(
+            size = WORKERS,
+            model_path = MODEL_PATH,
+            threshold = THRESHOLD,
+            on_alerts = dispatch_alerts,
+            stats = stats,
+            max_batch = MAX_BATCH_SIZE,
+            min_confidence = ALERT_MIN_CONFIDENCE,
+            cooldown = ALERT_COOLDOWN,
+            suppress_capacity = ALERT_SUPPRESS_CAPACITY,
+            reload_interval = MODEL_RELOAD_INTERVAL,
+            cache_config = (SCORE_CACHE_SIZE, SCORE_CACHE_PORT_BUCKET, SCORE_CACHE_LEN_BUCKET),
+            flow_config = (FLOW_WINDOW, FLOW_CAPACITY, FLOW_IDLE_TIMEOUT) if flows is not None else None,
+            live = not args.replay
+        ).start()
+        stats.flows = None # Flow tables live in the workers
+        stats.cache = pool.cache_metrics
+        stats.suppression = pool.suppression_metrics
+
+    # Hot model reload: watch model_path, and `kill -HUP <pid>` forces a check
+    watcher = ModelWatcher(detector, MODEL_RELOAD_INTERVAL).start() if detector else None
+    def on_sighup(signum, frame):
+        if watcher:
+            watcher.trigger()
+        if pool:
+            pool.reload()
+    signal.signal(signal.SIGHUP, on_sighup)
+
+    threading.Thread(target=sample_cpu, daemon=True, name="cpu-sampler").start()
+
+    if METRICS_PORT and not args.replay:
+        try:
+            MetricsServer(METRICS_PORT, collect_metrics).start()
+        except OSError as e:
+            print(f"⚠️ Metrics endpoint disabled: {e}")
+
+    if not DRY_RUN:
+        heartbeat_thread = threading.Thread(target= send_heartbeat, daemon= True)
+        retry_thread = threading.Thread(target=retry_worker, daemon=True)
+
+        heartbeat_thread.start()
+        retry_thread.start()
+
+    try:
+        monitor_traffic(args.replay, args.realtime)
+    except KeyboardInterrupt:
+        pass
 
-    heartbeat_thread.start()
-    retry_thread.start()
+    if pool:
+        pool.close()
 
-    monitor_traffic()
+    if args.replay or args.report:
+        stats.print_report()
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(stats.report(), f, indent=2)
+        print(f"📝 Report written to {args.report}")
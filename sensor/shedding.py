@@ -0,0 +1,80 @@
+import numpy as np
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+
+class LoadShedder:
+    """
+    Detects when scoring falls behind the capture and sheds bulk traffic.
+
+    Lag is how much later than usual packets reach the scorer: wall clock
+    minus packet timestamp, relative to the smallest delay seen so far (so a
+    realtime replay's clock offset cancels out). A capture backlog (unread
+    tshark pipe or packet socket queue) above backlog_limit bytes counts as
+    lagging too.
+
+    While lag exceeds the latency budget, rare traffic is always kept
+    (SYN-only, protocols other than TCP/UDP, destination ports never seen
+    before) and everything else is sampled down to sample_rate. Shedding
+    stops once lag falls below half the budget.
+    """
+    def __init__(self, latency_budget=0.5, sample_rate=0.1, backlog_limit=4 * 1024 * 1024, seed=None):
+        self.latency_budget = latency_budget
+        self.sample_rate = sample_rate
+        self.backlog_limit = backlog_limit
+        self.rng = np.random.default_rng(seed)
+        self.seen_ports = np.zeros(65536, dtype=bool)
+        self.baseline = None
+        self.lag = 0.0
+        self.shedding = False
+        self.considered = 0  # Packets that arrived while shedding
+        self.shed = 0
+        self.episodes = 0
+
+    def observe(self, now, newest_packet_time, backlog=0):
+        """Updates the lag estimate from the newest packet in a block."""
+        if newest_packet_time is not None and np.isfinite(newest_packet_time):
+            delay = now - newest_packet_time
+            if self.baseline is None or delay < self.baseline:
+                self.baseline = delay
+            self.lag = delay - self.baseline
+        overloaded = self.lag > self.latency_budget or (backlog or 0) > self.backlog_limit
+        if overloaded and not self.shedding:
+            self.shedding = True
+            self.episodes += 1
+            print(f"🪫 Sensor lagging {self.lag * 1000:.0f}ms behind capture, shedding bulk traffic")
+        elif self.shedding and self.lag < self.latency_budget / 2 and (backlog or 0) <= self.backlog_limit / 2:
+            self.shedding = False
+            print("🔋 Sensor caught up, scoring every packet again")
+
+    def select(self, features):
+        """
+        features: (n, 4) [frame_len, port, proto, flags]
+        Returns a boolean keep mask (all True unless shedding).
+        """
+        port, proto, flags = features[:, 1], features[:, 2], features[:, 3]
+        in_range = (port >= 0) & (port < 65536)
+        ports = np.where(in_range, port, 0)
+
+        if not self.shedding:
+            self.seen_ports[ports[in_range]] = True
+            return np.ones(len(features), dtype=bool)
+
+        keep = (flags & (TCP_SYN | TCP_ACK)) == TCP_SYN
+        keep |= (proto != 6) & (proto != 17)
+        keep |= ~in_range | ~self.seen_ports[ports]
+        keep |= self.rng.random(len(features)) < self.sample_rate
+        self.seen_ports[ports[in_range]] = True
+
+        self.considered += len(features)
+        self.shed += len(features) - int(keep.sum())
+        return keep
+
+    def metrics(self):
+        return {
+            "shedding": self.shedding,
+            "lag_ms": float(self.lag) * 1000,
+            "packets_shed": self.shed,
+            "shed_ratio_while_shedding": self.shed / self.considered if self.considered else 0.0,
+            "episodes": self.episodes
+        }
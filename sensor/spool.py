@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+class AlertSpool:
+    """
+    Durable FIFO of alerts the controller hasn't accepted yet (SQLite, WAL).
+
+    Survives restarts and is capped at max_alerts. When full, the overflow
+    policy decides what gives:
+      "coalesce" - fold the alert into the pending one for the same IP
+                   (highest score wins, its hits are added to "suppressed");
+                   a new IP pushes out the oldest pending alert
+      "drop"     - drop the new alert
+    """
+    def __init__(self, path="alert_spool.db", max_alerts=10000, overflow="coalesce"):
+        self.max_alerts = max_alerts
+        self.overflow = overflow
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS spool ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " ip TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " created REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS spool_ip ON spool (ip)")
+        self.depth = self.db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+        self.pushed = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.drained = 0
+        self.drain_times = deque(maxlen=10000)  # Timestamps of recent successful sends
+
+    def __len__(self):
+        return self.depth
+
+    def push(self, payload):
+        """Spools one alert payload (a dict with at least "ip" and "score")."""
+        with self.lock:
+            self.pushed += 1
+            if self.depth >= self.max_alerts:
+                if self.overflow == "drop":
+                    self.dropped += 1
+                    return
+                if self._coalesce(payload):
+                    return
+                oldest = self.db.execute("SELECT MIN(id) FROM spool").fetchone()[0]
+                self.db.execute("DELETE FROM spool WHERE id = ?", (oldest,))
+                self.depth -= 1
+                self.dropped += 1
+            self.db.execute("INSERT INTO spool (ip, payload, created) VALUES (?, ?, ?)",
+                            (payload["ip"], json.dumps(payload), time.time()))
+            self.depth += 1
+
+    def _coalesce(self, payload):
+        row = self.db.execute("SELECT id, payload FROM spool WHERE ip = ? ORDER BY id DESC LIMIT 1",
+                              (payload["ip"],)).fetchone()
+        if row is None:
+            return False
+        pending = json.loads(row[1])
+        pending["score"] = max(pending["score"], payload["score"])
+        pending["suppressed"] = pending.get("suppressed", 0) + 1 + payload.get("suppressed", 0)
+        self.db.execute("UPDATE spool SET payload = ? WHERE id = ?", (json.dumps(pending), row[0]))
+        self.coalesced += 1
+        return True
+
+    def peek(self, limit=100):
+        """Returns up to `limit` of the oldest (id, payload) pairs without removing them."""
+        with self.lock:
+            rows = self.db.execute("SELECT id, payload FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def remove(self, ids, sent=True):
+        """Deletes delivered (or undeliverable, sent=False) alerts."""
+        if not ids:
+            return
+        with self.lock:
+            self.db.executemany("DELETE FROM spool WHERE id = ?", [(i,) for i in ids])
+            self.depth = max(self.depth - len(ids), 0)
+            if sent:
+                self.drained += len(ids)
+                now = time.time()
+                self.drain_times.extend([now] * len(ids))
+            else:
+                self.dropped += len(ids)
+
+    def drain_rate(self, window=10.0):
+        """Alerts delivered per second over the last `window` seconds."""
+        cutoff = time.time() - window
+        with self.lock:
+            recent = sum(1 for t in self.drain_times if t >= cutoff)
+        return recent / window
+
+    def metrics(self):
+        return {
+            "depth": self.depth,
+            "max_alerts": self.max_alerts,
+            "pushed": self.pushed,
+            "drained": self.drained,
+            "drain_rate": self.drain_rate(),
+            "dropped": self.dropped,
+            "coalesced": self.coalesced
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
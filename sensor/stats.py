@@ -0,0 +1,142 @@
+import bisect
+import resource
+import time
+from collections import deque
+
+# Latency histogram bucket upper bounds (seconds), Prometheus style
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class StageTimer:
+    """
+    Latency samples for one pipeline stage (seconds).
+    Keeps running totals plus the most recent samples for percentiles.
+    """
+    def __init__(self, max_samples=10000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=max_samples)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last one is +Inf
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.samples.append(seconds)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def percentile(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def summary(self):
+        """Returns the stage latency in milliseconds."""
+        mean = self.total / self.count if self.count else 0.0
+        return {
+            "count": self.count,
+            "mean_ms": mean * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000
+        }
+
+
+class PipelineStats:
+    """
+    Counters and per-stage timers for the sensor hot path.
+    Stages: parse, batch (time for a batch to fill), predict, dispatch.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.packets = 0
+        self.parse_failures = 0  # Lines/frames the parser couldn't turn into a row
+        self.whitelisted = 0
+        self.scored = 0
+        self.alerts = 0
+        self.alerts_sent = 0
+        self.stages = {}
+        self.batcher = None  # AdaptiveBatcher, for batch size / flush reason metrics
+        self.flows = None    # FlowTable in (single process) flow mode
+        self.cache = None    # Callable returning score cache metrics
+        self.transport = None  # Callable returning controller connection metrics
+        self.spool = None      # Callable returning alert spool metrics
+        self.suppression = None  # Callable returning per-IP rate limit metrics
+        self.shedding = None     # Callable returning load shedding metrics
+
+    def stage(self, name):
+        if name not in self.stages:
+            self.stages[name] = StageTimer()
+        return self.stages[name]
+
+    def observe(self, name, seconds):
+        self.stage(name).observe(seconds)
+
+    def peak_rss_mb(self):
+        # ru_maxrss is reported in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+    def report(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+            "elapsed_s": elapsed,
+            "packets": self.packets,
+            "scored": self.scored,
+            "alerts": self.alerts,
+            "packets_per_sec": self.packets / elapsed,
+            "peak_rss_mb": self.peak_rss_mb(),
+            "stages": {name: t.summary() for name, t in self.stages.items()},
+            "batching": self.batcher.metrics() if self.batcher else None,
+            "flows": {
+                "open": len(self.flows),
+                "evictions": self.flows.evictions,
+                "dropped": self.flows.dropped,
+                "late_packets": self.flows.late_packets
+            } if self.flows is not None else None,
+            "score_cache": self.cache() if self.cache else None,
+            "transport": self.transport() if self.transport else None,
+            "spool": self.spool() if self.spool else None,
+            "suppression": self.suppression() if self.suppression else None,
+            "shedding": self.shedding() if self.shedding else None
+        }
+
+    def print_report(self):
+        r = self.report()
+        print("\n📊 Pipeline Report")
+        print(f"   Packets: {r['packets']} | Scored: {r['scored']} | Alerts: {r['alerts']}")
+        print(f"   Elapsed: {r['elapsed_s']:.2f}s | Throughput: {r['packets_per_sec']:.0f} pkt/s")
+        print(f"   Peak RSS: {r['peak_rss_mb']:.1f} MB")
+        if r["batching"]:
+            b = r["batching"]
+            print(f"   Batch size: {b['batch_size']} | Flushes: {b['flush_reasons']}")
+        if r["flows"]:
+            f = r["flows"]
+            print(f"   Flows open: {f['open']} | Evictions: {f['evictions']} | Dropped: {f['dropped']} | Late: {f['late_packets']}")
+        if r["score_cache"]:
+            c = r["score_cache"]
+            print(f"   Score cache: {c['size']}/{c['capacity']} | Hit rate: {c['hit_rate'] * 100:.1f}% "
+                  f"| Evictions: {c['evictions']}")
+        if r["transport"] and r["transport"]["requests"]:
+            t = r["transport"]
+            print(f"   Controller: {t['requests']} requests on {t['connections']} connections "
+                  f"(reuse {t['reuse_rate'] * 100:.1f}%) | p50={t['latency']['p50_ms']:.1f}ms "
+                  f"p99={t['latency']['p99_ms']:.1f}ms | Failures: {t['failures']}")
+        if r["spool"] and (r["spool"]["depth"] or r["spool"]["drained"]):
+            q = r["spool"]
+            print(f"   Spool: {q['depth']}/{q['max_alerts']} pending | Drained: {q['drained']} "
+                  f"({q['drain_rate']:.1f}/s) | Dropped: {q['dropped']} | Coalesced: {q['coalesced']}")
+        if r["suppression"]:
+            a = r["suppression"]
+            print(f"   Rate limit: {a['tracked']}/{a['capacity']} IPs | Suppressed: {a['suppressed']} "
+                  f"| Evictions: {a['evictions']}")
+        if r["shedding"] and r["shedding"]["episodes"]:
+            d = r["shedding"]
+            print(f"   Shedding: {d['packets_shed']} packets shed ({d['packets_shed'] / max(r['packets'], 1) * 100:.1f}% "
+                  f"of all, {d['shed_ratio_while_shedding'] * 100:.1f}% while shedding) in {d['episodes']} episode(s)")
+        for name, s in r["stages"].items():
+            print(f"   {name:<10} n={s['count']:<8} mean={s['mean_ms']:.3f}ms "
+                  f"p50={s['p50_ms']:.3f}ms p99={s['p99_ms']:.3f}ms max={s['max_ms']:.3f}ms")
@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+class AlertSuppressor:
+    """
+    Per-IP alert rate limit with a fixed memory ceiling (TTL + LRU).
+
+    An IP may alert once per `cooldown` seconds; hits inside the window are
+    counted and handed back with that IP's next alert. Entries are ordered
+    by their last alert, so expired ones (older than `ttl`) are swept from
+    the front, and when `capacity` is reached the oldest is evicted. A flood
+    of spoofed source IPs can't grow this past `capacity` entries.
+    """
+    def __init__(self, cooldown=30, capacity=100000, ttl=None):
+        self.cooldown = cooldown
+        self.capacity = capacity
+        # Keep suppressed counts around for a while after the window closes
+        self.ttl = ttl if ttl is not None else cooldown * 10
+        self.entries = OrderedDict()  # ip -> [last_alert_time, suppressed_hits]
+        self.suppressed = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def check(self, ip, now):
+        """
+        Returns None if `ip` is inside its cooldown window (the hit is counted),
+        otherwise the number of hits suppressed since its last alert.
+        """
+        entry = self.entries.get(ip)
+        if entry is not None and now - entry[0] < self.cooldown:
+            entry[1] += 1
+            self.suppressed += 1
+            return None
+
+        self._expire(now)
+        entry = self.entries.get(ip)
+        hits = 0
+        if entry is not None:
+            hits = entry[1]
+            entry[0], entry[1] = now, 0
+            self.entries.move_to_end(ip)
+        else:
+            if len(self.entries) >= self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[ip] = [now, 0]
+        return hits
+
+    def _expire(self, now):
+        entries = self.entries
+        while entries:
+            ip, entry = next(iter(entries.items()))
+            if now - entry[0] < self.ttl:
+                break
+            entries.popitem(last=False)
+
+    def metrics(self):
+        return {
+            "tracked": len(self.entries),
+            "capacity": self.capacity,
+            "suppressed": self.suppressed,
+            "evictions": self.evictions
+        }
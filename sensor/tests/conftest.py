@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The sensor modules import each other by bare name (run from sensor/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+from capture import PcapFileSource, make_sample_pcap, records_to_block, tshark_command
+from features import ip_to_u32, parse_tshark_block
+
+# tshark -T fields output (tshark_command's field list) for make_sample_pcap().
+# Regenerate with: python -c "import capture; capture.make_sample_pcap('s.pcap')"
+# && tshark -r s.pcap -T fields -e ip.src -e frame.len -e tcp.dstport -e udp.dstport
+#    -e ip.proto -e tcp.flags -e frame.time_epoch -E separator=,
+TSHARK_DUMP = os.path.join(os.path.dirname(__file__), "data", "sample_tshark.csv")
+
+@pytest.fixture
+def sample_pcap(tmp_path):
+    path = str(tmp_path / "sample.pcap")
+    make_sample_pcap(path)
+    return path
+
+def tshark_dump():
+    with open(TSHARK_DUMP) as f:
+        return parse_tshark_block(f.readlines(), with_time=True)
+
+def native(path):
+    return records_to_block(list(PcapFileSource(path).records()), with_time=True)
+
+def test_native_decoder_matches_tshark_dump(sample_pcap):
+    t_ips, t_features, t_times = tshark_dump()
+    n_ips, n_features, n_times = native(sample_pcap)
+    np.testing.assert_array_equal(n_ips, t_ips)
+    np.testing.assert_array_equal(n_features, t_features)
+    np.testing.assert_allclose(n_times, t_times, rtol=0, atol=1e-6)
+
+def test_sample_covers_decoder_edge_cases(sample_pcap):
+    ips, features, _ = native(sample_pcap)
+    rows = {(int(ip), *map(int, f)) for ip, f in zip(ips, features)}
+    # 10 frames, the ARP frame has no IPv4 source
+    assert len(ips) == 9
+    # VLAN tagged SYN keeps its TCP port and flags
+    assert (ip_to_u32("6.6.6.6"), 60, 22, 6, 0x002) in rows
+    # Non-first fragment: no L4 header, so no port
+    assert (ip_to_u32("5.5.5.5"), 600, 0, 17, 0) in rows
+    # Truncated jumbo frame: wire length, headers from the captured bytes
+    assert (ip_to_u32("7.7.7.7"), 9000, 3389, 6, 0x010) in rows
+
+def test_chunked_reads_return_every_record(sample_pcap):
+    source = PcapFileSource(sample_pcap, chunk_size=4)
+    chunks = []
+    while True:
+        chunk = source.read()
+        if chunk is None:
+            break
+        chunks.append(chunk)
+    assert [len(c) for c in chunks] == [4, 4, 1]
+
+@pytest.mark.skipif(shutil.which("tshark") is None, reason="tshark not installed")
+def test_tshark_dump_is_current(sample_pcap):
+    """The checked-in dump still matches what tshark prints for the sample."""
+    out = subprocess.run(tshark_command(pcap_file=sample_pcap), capture_output=True, text=True, check=True)
+    t_ips, t_features, _ = parse_tshark_block(out.stdout.splitlines(keepends=True), with_time=True)
+    d_ips, d_features, _ = tshark_dump()
+    np.testing.assert_array_equal(t_ips, d_ips)
+    np.testing.assert_array_equal(t_features, d_features)
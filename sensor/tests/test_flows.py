@@ -0,0 +1,52 @@
+import numpy as np
+
+from flows import FlowTable
+
+IP = 10 << 24 | 1
+
+def packets(*times, ip=IP):
+    """One 100-byte TCP ACK per time, all from `ip`."""
+    n = len(times)
+    features = np.tile(np.array([100, 443, 6, 0x10], dtype=np.int64), (n, 1))
+    return np.full(n, ip, dtype=np.int64), features, np.array(times, dtype=np.float64)
+
+def packet_rates(X):
+    return (X[:, 0] * 5).round().astype(int).tolist()
+
+def test_out_of_order_packets_inside_the_open_window_are_kept():
+    table = FlowTable(window=5)
+    table.update(*packets(1.0, 3.0))
+    table.update(*packets(2.0)) # Older than the previous batch but its window is still open
+    ips, X = table.flush()
+    assert ips.tolist() == [IP]
+    assert packet_rates(X) == [3]
+    assert table.late_packets == 0
+
+def test_packets_for_an_emitted_window_are_dropped_and_counted():
+    table = FlowTable(window=5)
+    table.update(*packets(1.0, 2.0))
+    ips, X = table.update(*packets(6.0)) # Moves to window 1, closing window 0
+    assert packet_rates(X) == [2]
+
+    ips, X = table.update(*packets(3.0, 4.0, 7.0)) # Two stragglers from window 0
+    assert len(ips) == 0 # Window 0 is not emitted a second time
+    assert table.late_packets == 2
+
+    ips, X = table.flush()
+    assert packet_rates(X) == [2] # Window 1 holds only its own packets
+
+def test_packets_for_a_window_closed_by_expire_are_late():
+    table = FlowTable(window=5)
+    table.update(*packets(1.0))
+    ips, X = table.expire(6.0)
+    assert packet_rates(X) == [1]
+
+    table.update(*packets(4.0)) # Window 0 was already scored
+    assert table.late_packets == 1
+    ips, _ = table.flush()
+    assert len(ips) == 0
+
+    table.update(*packets(8.0)) # The current window still opens normally
+    ips, X = table.flush()
+    assert packet_rates(X) == [1]
+    assert table.late_packets == 1
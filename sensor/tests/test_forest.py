@@ -0,0 +1,68 @@
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from detector import AnomalyDetector
+from forest import TOLERANCE, FlatForest, export_model
+
+def packet_rows(rng, n):
+    """[frame_len, port, proto, flags] rows shaped like real traffic."""
+    return np.column_stack([
+        rng.integers(60, 1515, n),
+        rng.choice([22, 53, 80, 443, 8080, 0], n),
+        rng.choice([6, 17, 1], n),
+        rng.choice([0x02, 0x10, 0x18, 0x12, 0], n)
+    ]).astype(np.int64)
+
+@pytest.fixture(scope="module")
+def fitted():
+    """A small forest, its training rows and held-out rows (plus out-of-range ones)."""
+    rng = np.random.default_rng(7)
+    model = IsolationForest(n_estimators=30, max_samples=256, random_state=0).fit(packet_rows(rng, 2000))
+    held_out = np.vstack([packet_rows(rng, 1000), rng.integers(0, 65536, size=(200, 4))])
+    return model, held_out
+
+def test_flattened_forest_matches_sklearn(fitted):
+    model, held_out = fitted
+    flat = FlatForest.from_sklearn(model)
+    diff = np.abs(flat.decision_function(held_out) - model.decision_function(held_out))
+    assert diff.max() <= TOLERANCE
+
+def test_flow_model_matches_sklearn():
+    rng = np.random.default_rng(3)
+    model = IsolationForest(n_estimators=20, random_state=1).fit(rng.gamma(2.0, 50.0, size=(1500, 6)))
+    held_out = rng.gamma(2.0, 50.0, size=(500, 6))
+    flat = FlatForest.from_sklearn(model)
+    assert np.abs(flat.decision_function(held_out) - model.decision_function(held_out)).max() <= TOLERANCE
+
+def test_npz_round_trip(fitted, tmp_path):
+    model, held_out = fitted
+    pkl, npz = str(tmp_path / "model.pkl"), str(tmp_path / "model.npz")
+    joblib.dump(model, pkl)
+    assert export_model(pkl, npz, samples=held_out) <= TOLERANCE
+
+    flat = FlatForest.load(npz)
+    assert flat.n_features_in_ == 4
+    assert np.abs(flat.decision_function(held_out) - model.decision_function(held_out)).max() <= TOLERANCE
+
+def test_detector_scores_npz_like_pkl(fitted, tmp_path):
+    pd = pytest.importorskip("pandas")
+    model, held_out = fitted
+    # create_model.py fits on a DataFrame, so the pickle carries feature names
+    columns = ['frame.len', 'port', 'ip.proto', 'tcp.flags']
+    rng = np.random.default_rng(7)
+    named = IsolationForest(n_estimators=30, max_samples=256, random_state=0).fit(
+        pd.DataFrame(packet_rows(rng, 2000), columns=columns))
+    pkl, npz = str(tmp_path / "model.pkl"), str(tmp_path / "model.npz")
+    joblib.dump(named, pkl)
+    export_model(pkl, npz, samples=held_out)
+
+    from_pkl = AnomalyDetector(model_path=pkl)
+    from_npz = AnomalyDetector(model_path=npz)
+    assert isinstance(from_npz.model, FlatForest)
+    raw_pkl, conf_pkl = from_pkl.score_array(held_out)
+    raw_npz, conf_npz = from_npz.score_array(held_out)
+    assert np.abs(raw_npz - raw_pkl).max() <= TOLERANCE
+    # Confidence is 2000x the raw score near the threshold
+    np.testing.assert_allclose(conf_npz, conf_pkl, rtol=0, atol=2000 * TOLERANCE)
@@ -0,0 +1,63 @@
+import socket
+import time
+
+import numpy as np
+import pytest
+
+from capture import AfPacketSource, build_frame, decode_ethernet, records_to_block
+from shedding import LoadShedder
+
+def native_block(age_seconds, count=20):
+    """Records as the native backend produces them, captured age_seconds ago."""
+    ts_us = int((time.time() - age_seconds) * 1000000)
+    frames = [build_frame("10.0.0.9", "10.0.0.50", 17, 443, 0, 1350) for _ in range(count)]
+    records = [decode_ethernet(memoryview(f), len(f), ts_us + i) for i, f in enumerate(frames)]
+    return records_to_block(records, with_time=True)
+
+def observe(shedder, block, backlog=0):
+    _, _, times = block
+    shedder.observe(time.time(), np.nanmax(times), backlog)
+
+def test_delayed_native_records_turn_shedding_on():
+    shedder = LoadShedder(latency_budget=0.5, seed=0)
+    observe(shedder, native_block(0.0))
+    assert not shedder.shedding
+    observe(shedder, native_block(2.0))
+    assert shedder.shedding
+    assert shedder.lag > 1.5
+    observe(shedder, native_block(0.0))
+    assert not shedder.shedding
+
+def test_socket_backlog_turns_shedding_on():
+    shedder = LoadShedder(latency_budget=0.5, backlog_limit=4096, seed=0)
+    observe(shedder, native_block(0.0), backlog=100000)
+    assert shedder.shedding
+
+def send_udp(count):
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for _ in range(count):
+        sender.sendto(b"\0" * 100, ("127.0.0.1", 9))
+    sender.close()
+
+def test_af_packet_uses_kernel_timestamps_and_reports_backlog():
+    try:
+        source = AfPacketSource("lo")
+    except (PermissionError, OSError) as e:
+        pytest.skip(f"AF_PACKET capture unavailable: {e}")
+    shedder = LoadShedder(latency_budget=0.5, seed=0)
+    try:
+        send_udp(5)
+        block = records_to_block(source.read(1), with_time=True)
+        observe(shedder, block)
+        assert not shedder.shedding
+
+        # Frames sit in the socket queue while the "scorer" is busy
+        send_udp(20)
+        time.sleep(0.8)
+        assert source.backlog() > 0
+        block = records_to_block(source.read(1), with_time=True)
+        assert len(block[0])
+        observe(shedder, block)
+        assert shedder.shedding
+    finally:
+        source.sock.close()
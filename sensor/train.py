@@ -1,93 +1,177 @@
+import argparse
 import subprocess
-import pandas as pd
+import numpy as np
 from sklearn.ensemble import IsolationForest
 import joblib
+from forest import export_model
+from capture import tshark_command, open_capture, PipeReader
+from flows import FlowTable, FLOW_FEATURES
 import time
 import os
-import sys
 
 # --- SETTINGS ---
 CAPTURE_INTERFACE = "eth0"  # Ensure this matches your interface (ip a)
-PACKET_LIMIT = 2000         # How many packets to learn from
+PACKET_LIMIT = 2000         # How many packets to learn from (live capture)
 MODEL_FILE = "model.pkl"
+FLAT_MODEL_FILE = "model.npz"  # What the sensor loads (see forest.py)
+FLOW_PACKET_LIMIT = 50000   # Flow mode learns from per-IP windows, so it needs more packets
+FLOW_WINDOW = 5             # Must match "flow_window" in config.json
+FLOW_CAPACITY = 65536       # Per-IP slots while aggregating, like "flow_capacity"
+FLOW_MODEL_FILE = "flow_model.pkl"
+FLAT_FLOW_MODEL_FILE = "flow_model.npz"
+SAMPLE_SIZE = 1000000       # Rows kept for fitting (reservoir), bounds memory on huge captures
+PACKET_FEATURES = ['frame.len', 'port', 'ip.proto', 'tcp.flags']
 
-def hex_to_int(val):
+class Reservoir:
     """
-    Helper Function: Converts '0x0010' (String) to 16 (Integer).
-    Also handles standard numbers and empty values.
+    Uniform sample of at most `size` rows from a stream of blocks
+    (reservoir sampling, vectorized per block). size=0 keeps every row.
     """
-    try:
-        return int(str(val), 0) # The '0' argument tells Python to guess base-10 or base-16
-    except:
-        return 0
-
-def capture_training_data():
-    print(f"📡 Capturing {PACKET_LIMIT} packets for baseline... (Generate normal traffic now!)")
-    
-    # Updated Tshark command with 'tcp.flags' AND 'udp.dstport'
-    cmd = [
-        "tshark", "-i", CAPTURE_INTERFACE,
-        "-c", str(PACKET_LIMIT),
-        "-T", "fields",
-        "-e", "frame.len",        # Feature 1
-        "-e", "tcp.dstport",      # Feature 2 (TCP Port)
-        "-e", "udp.dstport",      # Feature 3 (UDP Port)
-        "-e", "ip.proto",         # Feature 4
-        "-e", "tcp.flags",        # Feature 5
-        "-E", "separator=,",
-        "-E", "header=y"
-    ]
-    
-    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    stdout, stderr = process.communicate()
-    
-    if not stdout:
-        print("❌ Error: Tshark captured no data. Check interface name or sudo permissions.")
-        print(stderr)
-        return pd.DataFrame()
-
-    # Convert CSV string to DataFrame
-    from io import StringIO
-    data = StringIO(stdout)
-    df = pd.read_csv(data)
-    
-    # --- CLEANING DATA ---
-    # Fill empty values with 0
-    df = df.fillna(0)
-    
-    # Force convert all feature columns from Hex Strings to Integers
-    for col in ['frame.len', 'tcp.dstport', 'udp.dstport', 'ip.proto', 'tcp.flags']:
-        if col in df.columns:
-            df[col] = df[col].apply(hex_to_int)
-
-    # --- COMBINE PORTS ---
-    # Logic matching sensor/features.py: sum tcp and udp ports
-    if 'udp.dstport' in df.columns:
-        df['port'] = df['tcp.dstport'] + df['udp.dstport']
-    else:
-        df['port'] = df['tcp.dstport']
+    def __init__(self, size, width, dtype, seed=42):
+        self.size = size
+        self.rows = np.empty((size or 4096, width), dtype=dtype)
+        self.count = 0  # Rows kept
+        self.seen = 0   # Rows offered
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, block):
+        n = len(block)
+        if not n:
+            return
+        if not self.size:
+            if self.count + n > len(self.rows):
+                grown = np.empty((max(len(self.rows) * 2, self.count + n), self.rows.shape[1]), dtype=self.rows.dtype)
+                grown[:self.count] = self.rows[:self.count]
+                self.rows = grown
+            self.rows[self.count:self.count + n] = block
+            self.count += n
+            self.seen += n
+            return
+
+        # Fill the reservoir first, then row i (0-based, overall) replaces a
+        # random slot with probability size / (i + 1)
+        fill = min(self.size - self.count, n)
+        if fill:
+            self.rows[self.count:self.count + fill] = block[:fill]
+            self.count += fill
+        rest = block[fill:]
+        if len(rest):
+            positions = self.seen + fill + np.arange(len(rest))
+            slots = (self.rng.random(len(rest)) * (positions + 1)).astype(np.int64)
+            hit = slots < self.size
+            self.rows[slots[hit]] = rest[hit]
+        self.seen += n
+
+    def sample(self):
+        return self.rows[:self.count]
+
+def open_sources(files, interface, limit):
+    """
+    Yields (name, process, reader) for each pcap/CSV file, or for a live
+    capture of `limit` packets when no files are given.
+    """
+    if not files:
+        print(f"📡 Capturing {limit} packets on {interface} for baseline... (Generate normal traffic now!)")
+        process = subprocess.Popen(tshark_command(interface) + ["-c", str(limit)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        yield interface, process, PipeReader(process.stdout)
+        return
+    for path in files:
+        process, reader = open_capture(None, path)
+        yield path, process, reader
+
+def stream_blocks(files, interface, limit):
+    """
+    Streams parsed blocks (src_ips, features, times) from every source
+    without holding a whole capture in memory.
+    """
+    for name, process, reader in open_sources(files, interface, limit):
+        got = 0
+        while True:
+            items = reader.read(None)
+            if items is None:
+                break
+            if not items:
+                continue
+            block = reader.parse(items, with_time=True)
+            got += len(block[0])
+            yield block
+        if process:
+            process.wait()
+            if not got:
+                print(f"❌ Error: Tshark captured no data from {name}. Check interface name or sudo permissions.")
+                print(process.stderr.read())
 
-    return df
+def collect_packets(files, interface, limit, sample_size):
+    reservoir = Reservoir(sample_size, len(PACKET_FEATURES), np.int64)
+    start = time.time()
+    for _, features, _ in stream_blocks(files, interface, limit):
+        reservoir.add(features)
+        if reservoir.seen // 1000000 != (reservoir.seen - len(features)) // 1000000:
+            print(f"   {reservoir.seen:,} packets read ({reservoir.seen / (time.time() - start):,.0f}/s)")
+    print(f"📦 {reservoir.seen:,} packets read, training on {reservoir.count:,}")
+    return reservoir.sample()
 
-def train_model(df):
-    print(f"🧠 Training Isolation Forest on {len(df)} packets...")
-    
-    clf = IsolationForest(n_estimators=100, contamination=0.01, random_state=42)
-    
-    # Select the 4 features matching detector.py expectations
+def collect_flows(files, interface, limit, sample_size):
+    """
+    Aggregates packets into per-source-IP windows exactly like sensor.py
+    does, one block at a time.
+    """
+    reservoir = Reservoir(sample_size, len(FLOW_FEATURES), np.float64)
+    table = FlowTable(window=FLOW_WINDOW, capacity=FLOW_CAPACITY)
+    packets = 0
+    for src_ips, features, times in stream_blocks(files, interface, limit):
+        packets += len(src_ips)
+        reservoir.add(table.update(src_ips, features, times)[1])
+    reservoir.add(table.flush()[1])
+    print(f"📦 {packets:,} packets -> {reservoir.seen:,} flow windows, training on {reservoir.count:,}")
+    return reservoir.sample()
+
+def train_model(X, jobs):
+    print(f"🧠 Training Isolation Forest on {len(X)} packets...")
+
+    clf = IsolationForest(n_estimators=100, contamination=0.01, random_state=42, n_jobs=jobs)
+
+    # Same 4 features, same order, as detector.py:
     # ['frame.len', 'port', 'ip.proto', 'tcp.flags']
-    features = df[['frame.len', 'port', 'ip.proto', 'tcp.flags']]
-    
-    clf.fit(features)
-    
+    clf.fit(X)
+
     joblib.dump(clf, MODEL_FILE)
-    print(f"✅ Model saved to {MODEL_FILE}")
+    export_model(MODEL_FILE, FLAT_MODEL_FILE, samples=X[:5000])
+    print(f"✅ Model saved to {MODEL_FILE} (sensor format: {FLAT_MODEL_FILE})")
     print("   (You are now ready to run sensor.py)")
 
+def train_flow_model(X, jobs):
+    print(f"🧠 Training Isolation Forest on {len(X)} flow windows...")
+    clf = IsolationForest(n_estimators=100, contamination=0.01, random_state=42, n_jobs=jobs)
+    clf.fit(X)
+    joblib.dump(clf, FLOW_MODEL_FILE)
+    export_model(FLOW_MODEL_FILE, FLAT_FLOW_MODEL_FILE, samples=X[:5000])
+    print(f"✅ Flow model saved to {FLOW_MODEL_FILE} (sensor format: {FLAT_FLOW_MODEL_FILE})")
+    print('   (Set "mode": "flow" in config.json to use it)')
+
 if __name__ == "__main__":
-    if os.geteuid() != 0:
+    parser = argparse.ArgumentParser(description="Learn a baseline model from live traffic or saved captures")
+    parser.add_argument("files", nargs="*", metavar="FILE",
+                        help="pcap files or saved tshark output (.csv/.txt) to learn from instead of a live capture")
+    parser.add_argument("--flow", action="store_true", help="train the per-IP flow model")
+    parser.add_argument("-i", "--interface", default=CAPTURE_INTERFACE)
+    parser.add_argument("-c", "--count", type=int, default=None,
+                        help=f"packets to capture live (default {PACKET_LIMIT}, {FLOW_PACKET_LIMIT} with --flow)")
+    parser.add_argument("--sample", type=int, default=SAMPLE_SIZE,
+                        help="max rows to fit on, sampled uniformly from the whole input (0 keeps everything)")
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel fitting jobs (-1 = all cores)")
+    args = parser.parse_args()
+
+    if not args.files and os.geteuid() != 0:
         print("⚠️  Warning: You might need sudo to capture packets.")
-        
-    df = capture_training_data()
-    if not df.empty:
-        train_model(df)
+
+    limit = args.count or (FLOW_PACKET_LIMIT if args.flow else PACKET_LIMIT)
+    if args.flow:
+        X = collect_flows(args.files, args.interface, limit, args.sample)
+        if len(X):
+            train_flow_model(X, args.jobs)
+    else:
+        X = collect_packets(args.files, args.interface, limit, args.sample)
+        if len(X):
+            train_model(X, args.jobs)
@@ -0,0 +1,80 @@
+import gzip
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from stats import StageTimer
+
+class ControllerClient:
+    """
+    Keep-alive HTTPS client for everything the sensor sends to the controller.
+
+    One HTTPAdapter (a thread-safe urllib3 connection pool) is shared by a
+    requests.Session per thread, so the alert path, the retry thread and the
+    heartbeat thread reuse the same TLS connections instead of handshaking
+    on every post. Certificate verification is resolved once, up front.
+    """
+    def __init__(self, api_key, cert_path, pool_size=4):
+        self.headers = {"X-NIDS-Auth": api_key}
+        # Verify against the controller's certificate when we have it
+        self.verify = cert_path if cert_path and os.path.exists(cert_path) else False
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latency = StageTimer()
+        self.failures = 0
+
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.verify = self.verify
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+            self.local.session = session
+        return session
+
+    def post(self, url, payload, timeout):
+        """POSTs JSON; raises requests exceptions like requests.post does."""
+        return self._post(url, timeout, json=payload)
+
+    def post_batch(self, url, payloads, timeout):
+        """POSTs a list of JSON payloads as one gzip-compressed JSON array."""
+        body = gzip.compress(json.dumps(payloads, separators=(",", ":")).encode(), compresslevel=5)
+        return self._post(url, timeout, data=body,
+                          headers={"Content-Type": "application/json", "Content-Encoding": "gzip"})
+
+    def _post(self, url, timeout, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self.session().post(url, timeout=timeout, **kwargs)
+        except requests.RequestException:
+            with self.lock:
+                self.failures += 1
+            raise
+        finally:
+            with self.lock:
+                self.latency.observe(time.perf_counter() - t0)
+
+    def metrics(self):
+        """Request latency (ms) and how often an existing connection was reused."""
+        connections = requests_sent = 0
+        for key in list(self.adapter.poolmanager.pools.keys()):
+            pool = self.adapter.poolmanager.pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_sent += pool.num_requests
+        with self.lock:
+            latency = self.latency.summary()
+        return {
+            "requests": requests_sent,
+            "connections": connections,
+            "reuse_rate": 1.0 - connections / requests_sent if requests_sent else 0.0,
+            "failures": self.failures,
+            "latency": latency
+        }
@@ -0,0 +1,277 @@
+import multiprocessing as mp
+import os
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detector import AnomalyDetector, ModelWatcher
+from features import FEATURE_COUNT, u32_to_ip
+from flows import FlowTable
+from suppression import AlertSuppressor
+
+# One ring record: [src_ip (uint32), frame_len, port, proto, flags, time_us]
+RECORD_WIDTH = 2 + FEATURE_COUNT
+_HEADER = 2  # [write_count, read_count]
+
+class ShmRing:
+    """
+    Single-producer / single-consumer ring of int64 records in shared memory.
+    Only the two counters are updated under the lock; the lock acquire and
+    release also act as memory barriers for the record copies around them.
+    """
+    def __init__(self, capacity, lock, name=None):
+        self.capacity = capacity
+        self.lock = lock
+        size = (_HEADER + capacity * RECORD_WIDTH) * 8
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.header = np.ndarray((_HEADER,), dtype=np.int64, buffer=self.shm.buf)
+        self.data = np.ndarray((capacity, RECORD_WIDTH), dtype=np.int64, buffer=self.shm.buf, offset=_HEADER * 8)
+        if self.owner:
+            self.header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _counters(self):
+        with self.lock:
+            return int(self.header[0]), int(self.header[1])
+
+    def depth(self):
+        head, tail = self._counters()
+        return head - tail
+
+    def push(self, records):
+        """Copies as many records as fit. Returns the number written."""
+        head, tail = self._counters()
+        count = min(len(records), self.capacity - (head - tail))
+        if count <= 0:
+            return 0
+        start = head % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[start:start + first] = records[:first]
+        if count > first:
+            self.data[:count - first] = records[first:count]
+        with self.lock:
+            self.header[0] = head + count
+        return count
+
+    def pop(self, max_records):
+        """Returns a copy of up to max_records pending records."""
+        head, tail = self._counters()
+        count = min(head - tail, max_records)
+        if count <= 0:
+            return self.data[:0].copy()
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        if count > first:
+            records = np.concatenate((self.data[start:], self.data[:count - first]))
+        else:
+            records = self.data[start:start + count].copy()
+        with self.lock:
+            self.header[1] = tail + count
+        return records
+
+    def close(self):
+        # Workers are forked and share the parent's resource tracker, so only
+        # the creating (parent) side unlinks the segment.
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+def worker_main(index, ring_name, capacity, lock, results, stop, model_path, threshold,
+                max_batch, min_confidence, cooldown, suppress_capacity, reload_interval,
+                cache_config, flow_config, live):
+    """
+    Scoring process. Pops records from its ring, scores them with its own
+    AnomalyDetector and applies the per-IP rate limit locally. Packets are
+    sharded by source IP, so each IP's rate limit (and, in flow mode, its
+    FlowTable slot) lives in exactly one worker.
+    """
+    ring = ShmRing(capacity, lock, name=ring_name)
+    cache_size, port_bucket, len_bucket = cache_config
+    detector = AnomalyDetector(model_path=model_path, threshold=threshold, cache_size=cache_size,
+                               port_bucket=port_bucket, len_bucket=len_bucket)
+    # Each worker hot-reloads its own copy of the model (SIGHUP from the pool forces a check)
+    watcher = ModelWatcher(detector, reload_interval).start()
+    signal.signal(signal.SIGHUP, lambda signum, frame: watcher.trigger())
+    flows = FlowTable(*flow_config) if flow_config else None
+    suppressor = AlertSuppressor(cooldown, suppress_capacity)
+    scored = 0
+    predict_times = []
+    last_report = time.time()
+    last_expire = time.time()
+
+    def worker_metrics():
+        return {"score_cache": detector.cache_metrics(), "suppression": suppressor.metrics(),
+                "model": detector.get_model_metadata()}
+
+    def score(src_ips, X):
+        nonlocal scored
+        t0 = time.perf_counter()
+        raw_scores, confidences = detector.score_array(X)
+        predict_times.append(time.perf_counter() - t0)
+        scored += len(X)
+
+        alerts = []
+        now = time.time()
+        for i in np.flatnonzero(confidences > min_confidence):
+            ip = int(src_ips[i])
+            # Rate Limit per IP
+            suppressed = suppressor.check(ip, now)
+            if suppressed is None:
+                continue
+            alerts.append((u32_to_ip(ip), float(raw_scores[i]), float(confidences[i]), suppressed))
+        if alerts:
+            results.put(("alerts", index, alerts))
+
+    try:
+        while True:
+            records = ring.pop(max_batch)
+            if len(records):
+                src_ips, features = records[:, 0], records[:, 1:1 + FEATURE_COUNT]
+                if flows is not None:
+                    src_ips, features = flows.update(src_ips, features, records[:, -1] / 1e6)
+                if len(features):
+                    score(src_ips, features)
+            elif stop.is_set() and ring.depth() == 0:
+                if flows is not None:
+                    src_ips, windows = flows.flush()
+                    if len(windows):
+                        score(src_ips, windows)
+                break
+            else:
+                time.sleep(0.001)
+
+            if flows is not None and live and time.time() - last_expire >= 1.0:
+                src_ips, windows = flows.expire(time.time())
+                if len(windows):
+                    score(src_ips, windows)
+                last_expire = time.time()
+
+            if predict_times and (time.time() - last_report >= 1.0 or stop.is_set()):
+                results.put(("stats", index, scored, predict_times, worker_metrics()))
+                scored, predict_times = 0, []
+                last_report = time.time()
+    finally:
+        if predict_times:
+            results.put(("stats", index, scored, predict_times, worker_metrics()))
+        ring.close()
+
+class WorkerPool:
+    """
+    Fans parsed packets out to N scoring processes through shared-memory
+    rings, sharded by source IP, and merges their alerts back into a single
+    on_alerts([(ip, raw_score, confidence, suppressed), ...]) callback running in one thread.
+    Must be started before other threads (workers are forked).
+    """
+    def __init__(self, size, model_path, threshold, on_alerts, stats=None,
+                 ring_capacity=65536, max_batch=4096, min_confidence=20, cooldown=30,
+                 suppress_capacity=100000, reload_interval=5, cache_config=(0, 1, 1),
+                 flow_config=None, live=True):
+        self.size = size
+        self.on_alerts = on_alerts
+        self.stats = stats
+        self.ring_waits = 0
+        self.worker_metrics = {}  # Latest score cache / suppression metrics per worker
+        ctx = mp.get_context("fork")
+        self.stop = ctx.Event()
+        self.results = ctx.Queue()
+        self.rings = [ShmRing(ring_capacity, ctx.Lock()) for _ in range(size)]
+        self.processes = [
+            ctx.Process(target=worker_main, daemon=True, name=f"nids-worker-{i}",
+                        args=(i, ring.name, ring.capacity, ring.lock, self.results, self.stop,
+                              model_path, threshold, max_batch, min_confidence, cooldown,
+                              suppress_capacity, reload_interval, cache_config, flow_config, live))
+            for i, ring in enumerate(self.rings)
+        ]
+        self.collector = threading.Thread(target=self._collect, daemon=True)
+
+    def start(self):
+        for p in self.processes:
+            p.start()
+        self.collector.start()
+        print(f"⚙️ Scoring on {self.size} worker processes")
+        return self
+
+    def submit(self, src_ips, features, times):
+        """
+        Shards a parsed batch by source IP. Blocks while a ring is full, so
+        the tshark pipe backs up instead of the sensor dropping packets.
+        """
+        records = np.empty((len(features), RECORD_WIDTH), dtype=np.int64)
+        records[:, 0] = src_ips
+        records[:, 1:1 + FEATURE_COUNT] = features
+        records[:, -1] = times * 1e6
+        shards = src_ips % self.size
+        for index, ring in enumerate(self.rings):
+            pending = records[shards == index] if self.size > 1 else records
+            while len(pending):
+                written = ring.push(pending)
+                pending = pending[written:]
+                if len(pending):
+                    self.ring_waits += 1
+                    time.sleep(0.0005)
+
+    def _sum_metrics(self, key):
+        parts = [m[key] for m in self.worker_metrics.values() if m.get(key)]
+        if not parts:
+            return None
+        return {name: sum(p[name] for p in parts) for name in parts[0]}
+
+    def cache_metrics(self):
+        """Score cache metrics summed over the workers."""
+        total = self._sum_metrics("score_cache")
+        if total:
+            lookups = total["hits"] + total["misses"]
+            total["hit_rate"] = total["hits"] / lookups if lookups else 0.0
+        return total
+
+    def suppression_metrics(self):
+        """Alert suppression metrics summed over the workers."""
+        return self._sum_metrics("suppression")
+
+    def model_metadata(self):
+        """Model metadata as reported by the first worker (all load the same model_path)."""
+        for index in sorted(self.worker_metrics):
+            if self.worker_metrics[index].get("model"):
+                return self.worker_metrics[index]["model"]
+        return None
+
+    def reload(self):
+        """Asks every worker to check model_path now."""
+        for p in self.processes:
+            if p.pid:
+                os.kill(p.pid, signal.SIGHUP)
+
+    def depth(self):
+        return sum(ring.depth() for ring in self.rings)
+
+    def _collect(self):
+        while True:
+            message = self.results.get()
+            if message is None:
+                return
+            if message[0] == "alerts":
+                if message[2]:
+                    self.on_alerts(message[2])
+            elif message[0] == "stats" and self.stats:
+                _, index, scored, predict_times, metrics = message
+                self.worker_metrics[index] = metrics
+                self.stats.scored += scored
+                for seconds in predict_times:
+                    self.stats.observe("predict", seconds)
+
+    def close(self):
+        """Lets the workers drain their rings, then stops everything."""
+        self.stop.set()
+        for p in self.processes:
+            p.join()
+        self.results.put(None)
+        self.collector.join()
+        for ring in self.rings:
+            ring.close()